@@ -1,7 +1,10 @@
 import os  
 from dotenv import load_dotenv
-from azure.ai.projects import AIProjectClient  
 from azure.identity import DefaultAzureCredential  
+from budget import BudgetExceededError
+from metrics import export_metrics, record_run, select_model
+from project_client import create_project_client
+from recording import poll_interval
   
 # Agent Configuration
 AGENT_NAME = "joke-agent"  
@@ -14,18 +17,29 @@ AGENT_INSTRUCTIONS = (
 # User Message Configuration
 USER_MESSAGE_CONTENT = "Microsoft"  
 
+# Label for this script's run metrics
+FLOW_NAME = "01-basic-agent"
+
 # Load environment variables from .env file  
 load_dotenv()  
 
+# Apply the tenant's token budget before any resources are created  
+try:  
+    agent_model = select_model(AGENT_MODEL, FLOW_NAME)  
+except BudgetExceededError as e:  
+    print(f"Token budget exhausted: {e}")  
+    export_metrics()  
+    raise SystemExit(1)  
+
 # Initialize the AI Project Client
-project_client = AIProjectClient.from_connection_string(  
+project_client = create_project_client(  
     credential=DefaultAzureCredential(),  
     conn_str=os.environ.get("PROJECT_CONNECTION_STRING")  
 )  
 
-# Create an agent  
+# Create an agent, with the model the tenant's token budget allows  
 agent = project_client.agents.create_agent(  
-    model=AGENT_MODEL,  
+    model=agent_model,  
     name=AGENT_NAME,  
     instructions=AGENT_INSTRUCTIONS,  
     tools=[]  
@@ -44,9 +58,13 @@ message = project_client.agents.create_message(
 # Run the agent  
 run = project_client.agents.create_and_process_run(  
     thread_id=thread.id,  
-    assistant_id=agent.id  
+    assistant_id=agent.id,  
+    sleep_interval=poll_interval()  
 )  
 
+# Record the run's token usage, latency and tool calls
+record_run(project_client, run, FLOW_NAME)
+
 # Retrieve and print the agent's response  
 messages = project_client.agents.list_messages(thread_id=thread.id)  
 last_msg = messages.get_last_text_message_by_role("assistant")  
@@ -55,3 +73,6 @@ print(last_msg.text.value)
 # Clean up resources
 project_client.agents.delete_agent(agent.id)  
 project_client.agents.delete_thread(thread.id)
+
+# Write token usage and latency metrics, if AGENT_METRICS_PATH is set
+export_metrics()
@@ -1,9 +1,13 @@
 import os  
   
-from azure.ai.projects import AIProjectClient  
 from azure.ai.projects.models import FilePurpose, FileSearchTool  
 from azure.identity import DefaultAzureCredential  
   
+from budget import BudgetExceededError  
+from metrics import export_metrics, record_run, select_model  
+from project_client import create_project_client  
+from recording import poll_interval  
+  
 # === Environment Variables ===  
 PROJECT_CONNECTION_STRING_ENV = "PROJECT_CONNECTION_STRING"  
   
@@ -17,6 +21,7 @@ AGENT_INSTRUCTIONS = (
 )  
   
 # === Operational Constants ===  
+FLOW_NAME = "02-file-search"  # Label for this script's run metrics  
 FILE_PATH = './documents/product_catalog.pdf'  # Path to the local file to upload  
 VECTOR_STORE_NAME = "my_vectorstore"  
 USER_MESSAGE_CONTENT = "Can you provide details about the AI-Powered Smart Hub?"  
@@ -37,11 +42,19 @@ def main():
         )  
     print("Environment variables validated successfully.")  
   
+    # Apply the tenant's token budget before any resources are created  
+    try:  
+        agent_model = select_model(AGENT_MODEL, FLOW_NAME)  
+    except BudgetExceededError as e:  
+        print(f"Token budget exhausted: {e}")  
+        export_metrics()  
+        return  
+  
     try:  
         # Step 1: Initialize the AI Project Client with default credentials  
         print("Step 1: Initializing Azure AI Project Client...")  
         credential = DefaultAzureCredential()  
-        project_client = AIProjectClient.from_connection_string(  
+        project_client = create_project_client(  
             credential=credential,  
             conn_str=project_conn_str  
         )  
@@ -52,14 +65,16 @@ def main():
             print("Step 2: Uploading file to the project...")  
             uploaded_file = project_client.agents.upload_file_and_poll(  
                 file_path=FILE_PATH,  
-                purpose=FilePurpose.AGENTS  
+                purpose=FilePurpose.AGENTS,  
+                sleep_interval=poll_interval()  
             )  
             print(f"Uploaded file, file ID: {uploaded_file.id}")  
   
             print("Step 3: Creating vector store...")  
             vector_store = project_client.agents.create_vector_store_and_poll(  
                 file_ids=[uploaded_file.id],  
-                name=VECTOR_STORE_NAME  
+                name=VECTOR_STORE_NAME,  
+                sleep_interval=poll_interval()  
             )  
             print(f"Created vector store, vector store ID: {vector_store.id}")  
   
@@ -69,7 +84,7 @@ def main():
   
             print("Step 5: Creating agent with file search capabilities...")  
             agent = project_client.agents.create_agent(  
-                model=AGENT_MODEL,  
+                model=agent_model,  
                 name=AGENT_NAME,  
                 instructions=AGENT_INSTRUCTIONS,  
                 tools=file_search_tool.definitions,  
@@ -94,9 +109,11 @@ def main():
             print("Step 8: Running the agent...")  
             run = project_client.agents.create_and_process_run(  
                 thread_id=thread.id,  
-                assistant_id=agent.id  
+                assistant_id=agent.id,  
+                sleep_interval=poll_interval()  
             )  
             print(f"Run finished with status: {run.status}")  
+            record_run(project_client, run, FLOW_NAME)  
   
             if run.status == "failed":  
                 print(f"Run failed: {run.last_error}")  
@@ -121,6 +138,7 @@ def main():
     except Exception as e:  
         print(f"An error occurred: {e}")  
   
+    export_metrics()  
     print("File Search AI agent setup process completed.")  
   
   
@@ -1,9 +1,13 @@
 import os  
   
-from azure.ai.projects import AIProjectClient  
 from azure.ai.projects.models import BingGroundingTool  
 from azure.identity import DefaultAzureCredential  
   
+from budget import BudgetExceededError  
+from metrics import export_metrics, record_run, select_model  
+from project_client import create_project_client  
+from recording import poll_interval  
+  
 # === Environment Variables ===  
 PROJECT_CONNECTION_STRING_ENV = "PROJECT_CONNECTION_STRING"  
 BING_CONNECTION_NAME_ENV = "BING_CONNECTION_NAME"  
@@ -14,6 +18,7 @@ AGENT_MODEL = "gpt-4o"  # Ensure this model is supported
 AGENT_INSTRUCTIONS = "You are a helpful assistant."  
   
 # === Operational Constants ===  
+FLOW_NAME = "03-bing-search"  # Label for this script's run metrics  
 USER_MESSAGE_CONTENT = "Who is the current Prime Minister of the United Kingdom?"  
   
   
@@ -38,11 +43,19 @@ def main():
         )  
     print("Environment variables validated successfully.")  
   
+    # Apply the tenant's token budget before any resources are created  
+    try:  
+        agent_model = select_model(AGENT_MODEL, FLOW_NAME)  
+    except BudgetExceededError as e:  
+        print(f"Token budget exhausted: {e}")  
+        export_metrics()  
+        return  
+  
     try:  
         # Step 1: Initialize the AI Project Client with default credentials  
         print("Step 1: Initializing Azure AI Project Client...")  
         credential = DefaultAzureCredential()  
-        project_client = AIProjectClient.from_connection_string(  
+        project_client = create_project_client(  
             credential=credential,  
             conn_str=project_conn_str  
         )  
@@ -63,7 +76,7 @@ def main():
             # Step 3: Create an agent with the Bing Grounding tool  
             print("Step 3: Creating agent with Bing Grounding Tool...")  
             agent = project_client.agents.create_agent(  
-                model=AGENT_MODEL,  
+                model=agent_model,  
                 name=AGENT_NAME,  
                 instructions=AGENT_INSTRUCTIONS,  
                 tools=bing_tool.definitions,  
@@ -89,9 +102,11 @@ def main():
             print("Step 6: Running the agent...")  
             run = project_client.agents.create_and_process_run(  
                 thread_id=thread.id,  
-                assistant_id=agent.id  
+                assistant_id=agent.id,  
+                sleep_interval=poll_interval()  
             )  
             print(f"Run finished with status: {run.status}")  
+            record_run(project_client, run, FLOW_NAME)  
   
             if run.status == "failed":  
                 print(f"Run failed: {run.last_error}")  
@@ -127,6 +142,7 @@ def main():
     except Exception as e:  
         print(f"An error occurred: {e}")  
   
+    export_metrics()  
     print("Bing Grounding AI agent setup process completed.")  
   
   
@@ -1,9 +1,13 @@
 import os  
   
-from azure.ai.projects import AIProjectClient  
 from azure.ai.projects.models import CodeInterpreterTool, FilePurpose  
 from azure.identity import DefaultAzureCredential  
   
+from budget import BudgetExceededError  
+from metrics import export_metrics, record_run, select_model  
+from project_client import create_project_client  
+from recording import poll_interval  
+  
 # === Environment Variables ===  
 PROJECT_CONNECTION_STRING_ENV = "PROJECT_CONNECTION_STRING"  
   
@@ -13,6 +17,7 @@ AGENT_MODEL = "gpt-4o-mini"  # Ensure to use a supported model
 AGENT_INSTRUCTIONS = "You are a helpful agent."  
   
 # === Operational Constants ===  
+FLOW_NAME = "04-code-interpreter"  # Label for this script's run metrics  
 FILE_PATH = "./documents/quarterly_results.csv"  # Path to the local CSV file to upload  
 USER_MESSAGE_CONTENT = (  
     "Could you please create a bar chart in the TRANSPORTATION sector for the "  
@@ -36,11 +41,19 @@ def main():
         )  
     print("Environment variables validated successfully.")  
   
+    # Apply the tenant's token budget before any resources are created  
+    try:  
+        agent_model = select_model(AGENT_MODEL, FLOW_NAME)  
+    except BudgetExceededError as e:  
+        print(f"Token budget exhausted: {e}")  
+        export_metrics()  
+        return  
+  
     try:  
         # Step 1: Initialize the AI Project Client  
         print("Step 1: Initializing Azure AI Project Client...")  
         credential = DefaultAzureCredential()  
-        project_client = AIProjectClient.from_connection_string(  
+        project_client = create_project_client(  
             credential=credential,  
             conn_str=project_conn_str  
         )  
@@ -51,7 +64,8 @@ def main():
             print(f"Step 2: Uploading file '{FILE_PATH}'...")  
             uploaded_file = project_client.agents.upload_file_and_poll(  
                 file_path=FILE_PATH,  
-                purpose=FilePurpose.AGENTS  
+                purpose=FilePurpose.AGENTS,  
+                sleep_interval=poll_interval()  
             )  
             print(f"Uploaded file, file ID: {uploaded_file.id}")  
   
@@ -62,7 +76,7 @@ def main():
             # Step 4: Create an agent with the Code Interpreter tool  
             print("Step 4: Creating agent with Code Interpreter tool...")  
             agent = project_client.agents.create_agent(  
-                model=AGENT_MODEL,  
+                model=agent_model,  
                 name=AGENT_NAME,  
                 instructions=AGENT_INSTRUCTIONS,  
                 tools=code_interpreter.definitions,  
@@ -89,9 +103,11 @@ def main():
             print("Step 7: Running the agent...")  
             run = project_client.agents.create_and_process_run(  
                 thread_id=thread.id,  
-                assistant_id=agent.id  
+                assistant_id=agent.id,  
+                sleep_interval=poll_interval()  
             )  
             print(f"Run finished with status: {run.status}")  
+            record_run(project_client, run, FLOW_NAME)  
   
             if run.status == "failed":  
                 print(f"Run failed: {run.last_error}")  
@@ -136,6 +152,7 @@ def main():
     except Exception as e:  
         print(f"An error occurred: {e}")  
   
+    export_metrics()  
     print("Code Interpreter AI agent setup process completed.")  
   
   
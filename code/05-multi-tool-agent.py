@@ -1,6 +1,5 @@
 import os  
   
-from azure.ai.projects import AIProjectClient  
 from azure.ai.projects.models import (  
     BingGroundingTool,  
     CodeInterpreterTool,  
@@ -10,6 +9,11 @@ from azure.ai.projects.models import (
 )  
 from azure.identity import DefaultAzureCredential  
   
+from budget import BudgetExceededError  
+from metrics import export_metrics, record_run, select_model  
+from project_client import create_project_client  
+from recording import poll_interval  
+  
 # === Environment Variables ===  
 PROJECT_CONNECTION_STRING_ENV = "PROJECT_CONNECTION_STRING"  
 BING_CONNECTION_NAME_ENV = "BING_CONNECTION_NAME"  
@@ -22,30 +26,133 @@ AGENT_INSTRUCTIONS = (
     "and Bing search capabilities."  
 )  
   
+# === Tool Names ===  
+BING_TOOL = "bing_grounding"  
+FILE_SEARCH_TOOL = "file_search"  
+CODE_INTERPRETER_TOOL = "code_interpreter"  
+  
 # === Operational Constants ===  
+FLOW_NAME = "05-multi-tool-agent"  # Label for this script's run metrics  
 FILE_SEARCH_FILE_PATH = './documents/product_catalog.pdf'        # Path for file search  
 CODE_INTERPRETER_FILE_PATH = "./documents/quarterly_results.csv"  # Path for code interpretation  
 VECTOR_STORE_NAME = "my_vectorstore"  
+# Each message is routed to the tool it needs; that tool is provisioned on first use  
 USER_MESSAGES = [  
     {  
         "role": "user",  
-        "content": "Who is the current Prime Minister of the United Kingdom?"  
+        "content": "Who is the current Prime Minister of the United Kingdom?",  
+        "tool": BING_TOOL  
     },  
     {  
         "role": "user",  
-        "content": "Can you provide details about the AI-Powered Smart Hub?"  
+        "content": "Can you provide details about the AI-Powered Smart Hub?",  
+        "tool": FILE_SEARCH_TOOL  
     },  
     {  
         "role": "user",  
         "content": (  
             "Could you please create a bar chart in the TRANSPORTATION sector for the "  
             "operating profit from the uploaded CSV file and provide the file to me?"  
-        )  
+        ),  
+        "tool": CODE_INTERPRETER_TOOL  
     }  
 ]  
 TARGET_DIR = './documents'  # Directory to save generated files  
   
   
+def provision_bing_tool(project_client, bing_connection_name):  
+    """  
+    Looks up the Bing connection and builds the Bing Grounding tool.  
+    """  
+    bing_connection = project_client.connections.get(  
+        connection_name=bing_connection_name  
+    )  
+    print(f"Bing connection ID: {bing_connection.id}")  
+    return {"tool": BingGroundingTool(connection_id=bing_connection.id)}  
+  
+  
+def provision_file_search_tool(project_client):  
+    """  
+    Uploads the file search document, indexes it in a vector store and builds the File Search tool.  
+    """  
+    print(f"Uploading file for file search '{FILE_SEARCH_FILE_PATH}'...")  
+    file_search_file = project_client.agents.upload_file_and_poll(  
+        file_path=FILE_SEARCH_FILE_PATH,  
+        purpose=FilePurpose.AGENTS,  
+        sleep_interval=poll_interval()  
+    )  
+    print(f"Uploaded file for file search, file ID: {file_search_file.id}")  
+  
+    print(f"Creating vector store '{VECTOR_STORE_NAME}'...")  
+    vector_store = project_client.agents.create_vector_store_and_poll(  
+        file_ids=[file_search_file.id],  
+        name=VECTOR_STORE_NAME,  
+        sleep_interval=poll_interval()  
+    )  
+    print(f"Created vector store, vector store ID: {vector_store.id}")  
+    return {  
+        "tool": FileSearchTool(vector_store_ids=[vector_store.id]),  
+        "vector_store_id": vector_store.id  
+    }  
+  
+  
+def provision_code_interpreter_tool(project_client):  
+    """  
+    Uploads the code interpreter data file and builds the Code Interpreter tool.  
+    """  
+    print(f"Uploading file for code interpretation '{CODE_INTERPRETER_FILE_PATH}'...")  
+    code_interpreter_file = project_client.agents.upload_file_and_poll(  
+        file_path=CODE_INTERPRETER_FILE_PATH,  
+        purpose=FilePurpose.AGENTS,  
+        sleep_interval=poll_interval()  
+    )  
+    print(f"Uploaded file for code interpretation, file ID: {code_interpreter_file.id}")  
+    return {  
+        "tool": CodeInterpreterTool(file_ids=[code_interpreter_file.id]),  
+        "file_id": code_interpreter_file.id  
+    }  
+  
+  
+def ensure_tool(project_client, agent, provisioned_tools, tool_name, bing_connection_name):  
+    """  
+    Provisions a tool the first time a message is routed to it and attaches it to the agent.  
+  
+    Tools are provisioned at most once per session, so a tool that no message needs never  
+    pays for its uploads, vector store or connection lookup.  
+    """  
+    if tool_name in provisioned_tools:  
+        return  
+  
+    print(f"Provisioning '{tool_name}' tool on first use...")  
+    if tool_name == BING_TOOL:  
+        provisioned_tools[tool_name] = provision_bing_tool(project_client, bing_connection_name)  
+    elif tool_name == FILE_SEARCH_TOOL:  
+        provisioned_tools[tool_name] = provision_file_search_tool(project_client)  
+    elif tool_name == CODE_INTERPRETER_TOOL:  
+        provisioned_tools[tool_name] = provision_code_interpreter_tool(project_client)  
+    else:  
+        raise ValueError(f"Unknown tool '{tool_name}'")  
+  
+    # Rebuild the agent's tool definitions and resources from everything provisioned so far  
+    tool_definitions = []  
+    tool_resources = ToolResources()  
+    for provisioned in provisioned_tools.values():  
+        tool = provisioned["tool"]  
+        tool_definitions += tool.definitions  
+        if isinstance(tool, FileSearchTool):  
+            tool_resources.file_search = tool.resources['file_search']  
+        elif isinstance(tool, CodeInterpreterTool):  
+            tool_resources.code_interpreter = tool.resources['code_interpreter']  
+  
+    project_client.agents.update_agent(  
+        assistant_id=agent.id,  
+        tools=tool_definitions,  
+        tool_resources=tool_resources,  
+        headers={"x-ms-enable-preview": "true"}  
+    )  
+    print(f"Attached '{tool_name}' tool to agent, ID: {agent.id}")  
+  
+  
 def main():  
     """  
     Main function to set up an agent with multiple tools, interact with it, and manage resources.  
@@ -67,90 +174,65 @@ def main():
         )  
     print("Environment variables validated successfully.")  
   
+    # Apply the tenant's token budget before any resources are created  
+    try:  
+        agent_model = select_model(AGENT_MODEL, FLOW_NAME)  
+    except BudgetExceededError as e:  
+        print(f"Token budget exhausted: {e}")  
+        export_metrics()  
+        return  
+  
     try:  
         # Step 1: Initialize the AI Project Client  
         print("Step 1: Initializing Azure AI Project Client...")  
         credential = DefaultAzureCredential()  
-        project_client = AIProjectClient.from_connection_string(  
+        project_client = create_project_client(  
             credential=credential,  
             conn_str=project_conn_str  
         )  
         print("Azure AI Project Client initialized.")  
   
         with project_client:  
-            # Step 2: Enable the Grounding with Bing search tool  
-            print("Step 2: Enabling Bing Grounding Tool...")  
-            bing_connection = project_client.connections.get(  
-                connection_name=bing_connection_name  
-            )  
-            bing_conn_id = bing_connection.id  
-            print(f"Bing connection ID: {bing_conn_id}")  
-  
-            bing_tool = BingGroundingTool(connection_id=bing_conn_id)  
-  
-            # Step 3: Upload files and set up tools  
-            print("Step 3: Uploading files and setting up tools...")  
-  
-            # Step 3.1: Upload file for file search  
-            print(f"Step 3.1: Uploading file for file search '{FILE_SEARCH_FILE_PATH}'...")  
-            file_search_file = project_client.agents.upload_file_and_poll(  
-                file_path=FILE_SEARCH_FILE_PATH,  
-                purpose=FilePurpose.AGENTS  
-            )  
-            print(f"Uploaded file for file search, file ID: {file_search_file.id}")  
-  
-            # Step 3.2: Create Vector Store  
-            print(f"Step 3.2: Creating vector store '{VECTOR_STORE_NAME}'...")  
-            vector_store = project_client.agents.create_vector_store_and_poll(  
-                file_ids=[file_search_file.id],  
-                name=VECTOR_STORE_NAME  
-            )  
-            print(f"Created vector store, vector store ID: {vector_store.id}")  
-  
-            # Step 3.3: Upload file for code interpretation  
-            print(f"Step 3.3: Uploading file for code interpretation '{CODE_INTERPRETER_FILE_PATH}'...")  
-            code_interpreter_file = project_client.agents.upload_file_and_poll(  
-                file_path=CODE_INTERPRETER_FILE_PATH,  
-                purpose=FilePurpose.AGENTS  
-            )  
-            print(f"Uploaded file for code interpretation, file ID: {code_interpreter_file.id}")  
-  
-            # Step 3.4: Initialize File Search and Code Interpreter tools  
-            print("Step 3.4: Initializing File Search and Code Interpreter tools...")  
-            file_search_tool = FileSearchTool(vector_store_ids=[vector_store.id])  
-            code_interpreter_tool = CodeInterpreterTool(file_ids=[code_interpreter_file.id])  
-  
-            # Step 4: Combine tools and resources  
-            print("Step 4: Combining tools and resources...")  
-            combined_tool_resources = ToolResources(  
-                file_search=file_search_tool.resources['file_search'],  
-                code_interpreter=code_interpreter_tool.resources['code_interpreter']  
-            )  
-  
-            # Step 5: Create an agent with all tools including Bing  
-            print("Step 5: Creating agent with all tools...")  
+            # Step 2: Create an agent without tools; tools are attached as messages need them  
+            print("Step 2: Creating agent...")  
             agent = project_client.agents.create_agent(  
-                model=AGENT_MODEL,  
+                model=agent_model,  
                 name=AGENT_NAME,  
                 instructions=AGENT_INSTRUCTIONS,  
-                tools=(  
-                    file_search_tool.definitions +  
-                    code_interpreter_tool.definitions +  
-                    bing_tool.definitions  
-                ),  
-                tool_resources=combined_tool_resources,  
                 headers={"x-ms-enable-preview": "true"}  
             )  
             print(f"Created agent, ID: {agent.id}")  
+            provisioned_tools = {}  
   
-            # Step 6: Create a conversation thread and add user messages  
-            print("Step 6: Creating conversation thread and adding user messages...")  
+            # Step 3: Create a conversation thread and add user messages  
+            print("Step 3: Creating conversation thread and adding user messages...")  
             thread = project_client.agents.create_thread()  
             print(f"Created thread, ID: {thread.id}")  
   
             for idx, user_msg in enumerate(USER_MESSAGES, start=1):  
-                # Step 6.{idx}: Adding user message {idx}  
-                print(f"Step 6.{idx}: Adding user message {idx}: {user_msg['content']}")  
+                # Apply the tenant's token budget to each run; stop once it is used up  
+                try:  
+                    run_model = select_model(agent_model, FLOW_NAME)  
+                except BudgetExceededError as e:  
+                    print(f"Skipping the remaining messages: {e}")  
+                    break  
+                if run_model != agent_model:  
+                    print(f"Switching agent to model '{run_model}' to stay within the token budget...")  
+                    project_client.agents.update_agent(assistant_id=agent.id, model=run_model)  
+                    agent_model = run_model  
+  
+                # Step 4.{idx}: Provision the tool this message is routed to  
+                print(f"Step 4.{idx}: Preparing '{user_msg['tool']}' tool for message {idx}...")  
+                ensure_tool(  
+                    project_client,  
+                    agent,  
+                    provisioned_tools,  
+                    user_msg["tool"],  
+                    bing_connection_name  
+                )  
+  
+                # Step 5.{idx}: Adding user message {idx}  
+                print(f"Step 5.{idx}: Adding user message {idx}: {user_msg['content']}")  
                 message = project_client.agents.create_message(  
                     thread_id=thread.id,  
                     role=user_msg["role"],  
@@ -158,24 +240,25 @@ def main():
                 )  
                 print(f"Created user message {idx}, ID: {message.id}")  
   
-                # Step 7.{idx}: Run the agent for each user message  
-                print(f"Step 7.{idx}: Running the agent for message {idx}...")  
+                # Step 6.{idx}: Run the agent for each user message  
+                print(f"Step 6.{idx}: Running the agent for message {idx}...")  
                 run = project_client.agents.create_and_process_run(  
                     thread_id=thread.id,  
-                    assistant_id=agent.id  
+                    assistant_id=agent.id,  
+                    sleep_interval=poll_interval()  
                 )  
                 print(f"Run {idx} finished with status: {run.status}")  
+                record_run(project_client, run, FLOW_NAME)  
   
                 if run.status == "failed":  
                     print(f"Run {idx} failed: {run.last_error}")  
                     continue  
   
-                # Step 8.{idx}: Retrieve and print the agent's response  
-                print(f"Step 8.{idx}: Retrieving agent's response for message {idx}...")  
+                # Step 7.{idx}: Retrieve and print the agent's response  
+                print(f"Step 7.{idx}: Retrieving agent's response for message {idx}...")  
                 messages = project_client.agents.list_messages(thread_id=thread.id)  
   
-                if user_msg["content"].startswith("Could you please create a bar chart"):  
-                    # Assuming this is for code interpreter output  
+                if user_msg["tool"] == CODE_INTERPRETER_TOOL:  
                     last_msg = messages.get_last_message_by_role("assistant")  
                     if last_msg:  
                         # Print text response  
@@ -190,7 +273,7 @@ def main():
                                 # Explicitly set file_name to 'chart.png' for this context  
                                 file_name = 'chart.png'  
                                 if file_id:  
-                                    print(f"Step 8.{idx}: Saving generated file '{file_name}'...")  
+                                    print(f"Step 7.{idx}: Saving generated file '{file_name}'...")  
                                     project_client.agents.save_file(  
                                         file_id=file_id,  
                                         file_name=file_name,  
@@ -202,15 +285,19 @@ def main():
                     if last_msg:  
                         print(f"Agent Response: {last_msg.text.value}")  
   
-            # Step 9: Clean up resources  
-            print("Step 9: Cleaning up resources...")  
-            print(f"Deleting vector store (ID: {vector_store.id})...")  
-            project_client.agents.delete_vector_store(vector_store.id)  
-            print(f"Deleted vector store, ID: {vector_store.id}")  
+            # Step 8: Clean up only the resources that were actually provisioned  
+            print("Step 8: Cleaning up resources...")  
+            file_search = provisioned_tools.get(FILE_SEARCH_TOOL)  
+            if file_search:  
+                print(f"Deleting vector store (ID: {file_search['vector_store_id']})...")  
+                project_client.agents.delete_vector_store(file_search["vector_store_id"])  
+                print(f"Deleted vector store, ID: {file_search['vector_store_id']}")  
   
-            print(f"Deleting code interpreter file (ID: {code_interpreter_file.id})...")  
-            project_client.agents.delete_file(code_interpreter_file.id)  
-            print(f"Deleted code interpreter file, ID: {code_interpreter_file.id}")  
+            code_interpreter = provisioned_tools.get(CODE_INTERPRETER_TOOL)  
+            if code_interpreter:  
+                print(f"Deleting code interpreter file (ID: {code_interpreter['file_id']})...")  
+                project_client.agents.delete_file(code_interpreter["file_id"])  
+                print(f"Deleted code interpreter file, ID: {code_interpreter['file_id']}")  
   
             print(f"Deleting agent (ID: {agent.id})...")  
             project_client.agents.delete_agent(agent.id)  
@@ -219,6 +306,7 @@ def main():
     except Exception as e:  
         print(f"An error occurred: {e}")  
   
+    export_metrics()  
     print("Multi-Tool AI agent setup process completed.")  
   
   
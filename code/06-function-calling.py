@@ -1,43 +1,18 @@
 import os  
-import json
-import datetime
+import time
 from dotenv import load_dotenv
-from azure.ai.projects import AIProjectClient  
-from azure.ai.projects.models import FunctionTool, ToolSet
+from azure.ai.projects.models import SubmitToolOutputsAction
 from azure.identity import DefaultAzureCredential  
+from budget import BudgetExceededError
+from metrics import export_metrics, record_run, select_model
+from project_client import create_project_client
+from recording import poll_interval
+from tool_registry import ToolRegistry
 
-def fetch_weather(location: str) -> str:
-    """
-    Fetches the weather information for the specified location.
-
-    :param location (str): The location to fetch weather for.
-    :return: Weather information as a JSON string.
-    :rtype: str
-    """
-    # In a real-world scenario, you'd integrate with a weather API.
-    # Here, we'll mock the response.
-    mock_weather_data = {"New York": "Sunny, 25°C", "London": "Cloudy, 18°C", "Tokyo": "Rainy, 22°C"}
-    weather = mock_weather_data.get(location, "Weather data not available for this location.")
-    weather_json = json.dumps({"weather": weather})
-    return weather_json
-
-
-def get_current_time() -> str:
-    """
-    Gets the current time in AM/PM format.
-
-    :return: The current time in AM/PM format.
-    :rtype: str
-    """
-    current_time = datetime.datetime.now().strftime("%I:%M:%S %p")
-    return current_time
-
-user_functions = set()
-user_functions.add(fetch_weather)
-user_functions.add(get_current_time)
-functions = FunctionTool(user_functions)
-toolset = ToolSet()
-toolset.add(functions)
+# Function schemas are compiled from user_functions.py once and cached; the module itself
+# is only imported when the agent calls one of its functions
+registry = ToolRegistry()
+registry.register_module("user_functions")
   
 # Agent Configuration
 AGENT_NAME = "weather-agent"
@@ -50,21 +25,32 @@ AGENT_INSTRUCTIONS = (
 # USER_MESSAGE_CONTENT = "What's the weather in New York?"
 USER_MESSAGE_CONTENT = "What's the current time?"
 
+# Label for this script's run metrics
+FLOW_NAME = "06-function-calling"
+
 # Load environment variables from .env file  
 load_dotenv()  
 
+# Apply the tenant's token budget before any resources are created  
+try:  
+    agent_model = select_model(AGENT_MODEL, FLOW_NAME)  
+except BudgetExceededError as e:  
+    print(f"Token budget exhausted: {e}")  
+    export_metrics()  
+    raise SystemExit(1)  
+
 # Initialize the AI Project Client
-project_client = AIProjectClient.from_connection_string(  
+project_client = create_project_client(  
     credential=DefaultAzureCredential(),  
     conn_str=os.environ.get("PROJECT_CONNECTION_STRING")  
 )  
 
-# Create an agent  
+# Create an agent, with the model the tenant's token budget allows  
 agent = project_client.agents.create_agent(  
-    model=AGENT_MODEL,  
+    model=agent_model,  
     name=AGENT_NAME,  
     instructions=AGENT_INSTRUCTIONS,  
-    toolset=toolset
+    tools=registry.definitions
 )  
 
 # Create a thread  
@@ -77,11 +63,24 @@ message = project_client.agents.create_message(
     content=USER_MESSAGE_CONTENT  
 )
 
-# Run the agent  
-run = project_client.agents.create_and_process_run(  
+# Run the agent, executing function calls as the agent requests them
+run = project_client.agents.create_run(  
     thread_id=thread.id,  
     assistant_id=agent.id  
 )  
+while run.status in ["queued", "in_progress", "requires_action"]:
+    time.sleep(poll_interval())
+    run = project_client.agents.get_run(thread_id=thread.id, run_id=run.id)
+    if run.status == "requires_action" and isinstance(run.required_action, SubmitToolOutputsAction):
+        tool_outputs = registry.execute_tool_calls(run.required_action.submit_tool_outputs.tool_calls)
+        project_client.agents.submit_tool_outputs_to_run(
+            thread_id=thread.id,
+            run_id=run.id,
+            tool_outputs=tool_outputs
+        )
+
+# Record the run's token usage, latency and tool calls
+record_run(project_client, run, FLOW_NAME)
 
 # Retrieve and print the agent's response  
 messages = project_client.agents.list_messages(thread_id=thread.id)  
@@ -91,3 +90,6 @@ print(last_msg.text.value)
 # Clean up resources
 project_client.agents.delete_agent(agent.id)  
 project_client.agents.delete_thread(thread.id)
+
+# Write token usage and latency metrics, if AGENT_METRICS_PATH is set
+export_metrics()
@@ -0,0 +1,364 @@
+"""
+Reusable version of the lab's agent flow, driven by a job specification instead of module constants.
+
+A job specification is a dictionary such as::
+
+    {
+        "prompt": "Can you provide details about the AI-Powered Smart Hub?",
+        "agent": {
+            "model": "gpt-4o-mini",
+            "name": "file-search-agent",
+            "instructions": "You are a helpful assistant.",
+            "tools": ["file_search"]
+        },
+        "files": ["./documents/product_catalog.pdf"],
+        "output_dir": "./documents",
+        "tenant": "team-a"
+    }
+
+``tools`` may contain ``file_search``, ``code_interpreter`` and ``bing_grounding``. Input files are
+uploaded once and attached to every file-based tool that is requested. The optional ``tenant`` names
+the token budget the job is charged to; it defaults to ``AGENT_TENANT``.
+"""
+import os
+import time
+
+from azure.ai.projects.models import (
+    BingGroundingTool,
+    CodeInterpreterTool,
+    FilePurpose,
+    FileSearchTool,
+    ToolResources
+)
+from azure.core.exceptions import ResourceNotFoundError
+
+from checkpoint import (
+    STAGE_AGENT_CREATED,
+    STAGE_CLEANED_UP,
+    STAGE_COMPLETED,
+    STAGE_FILE_UPLOADED,
+    STAGE_MESSAGE_CREATED,
+    STAGE_RUN_SUBMITTED,
+    STAGE_THREAD_CREATED,
+    STAGE_VECTOR_STORE_CREATED,
+    JobCheckpoint
+)
+from metrics import record_run, select_model
+from recording import poll_interval
+from resource_ledger import KIND_AGENT, KIND_FILE, KIND_THREAD, KIND_VECTOR_STORE, get_ledger
+
+# === Environment Variables ===
+BING_CONNECTION_NAME_ENV = "BING_CONNECTION_NAME"
+
+# === Tool Names ===
+BING_TOOL = "bing_grounding"
+FILE_SEARCH_TOOL = "file_search"
+CODE_INTERPRETER_TOOL = "code_interpreter"
+
+# === Defaults ===
+DEFAULT_AGENT_MODEL = "gpt-4o-mini"
+DEFAULT_AGENT_NAME = "worker-agent"
+DEFAULT_AGENT_INSTRUCTIONS = "You are a helpful assistant."
+VECTOR_STORE_NAME = "worker_vectorstore"
+FLOW_NAME = "agent-job"  # Label for run metrics
+RUN_POLL_INTERVAL = 1  # Seconds between run status checks
+TERMINAL_RUN_STATUSES = ("completed", "failed", "cancelled", "expired")
+UNSUCCESSFUL_RUN_STATUSES = ("failed", "cancelled", "expired")
+
+# Resource kinds mapped to the operations that look them up
+_GETTERS = {
+    KIND_FILE: "get_file",
+    KIND_VECTOR_STORE: "get_vector_store",
+    KIND_AGENT: "get_agent",
+    KIND_THREAD: "get_thread",
+}
+
+
+class JobSpecError(ValueError):
+    """
+    Raised when a job specification cannot be run.
+    """
+
+
+def validate_job_spec(spec):
+    """
+    Checks that a job specification has a prompt, known tools and readable input files.
+    """
+    if not spec.get("prompt"):
+        raise JobSpecError("Job specification is missing 'prompt'.")
+    tools = spec.get("agent", {}).get("tools", [])
+    unknown = [tool for tool in tools if tool not in (BING_TOOL, FILE_SEARCH_TOOL, CODE_INTERPRETER_TOOL)]
+    if unknown:
+        raise JobSpecError(f"Unknown tool(s): {', '.join(unknown)}")
+    for path in spec.get("files", []):
+        if not os.path.isfile(path):
+            raise JobSpecError(f"Input file '{path}' does not exist.")
+    if FILE_SEARCH_TOOL in tools and not spec.get("files"):
+        raise JobSpecError("The 'file_search' tool needs at least one input file.")
+
+
+def build_tools(project_client, tool_names, file_ids, vector_store_id):
+    """
+    Returns the tool definitions and resources for the requested tools.
+    """
+    definitions = []
+    resources = ToolResources()
+    if FILE_SEARCH_TOOL in tool_names:
+        file_search_tool = FileSearchTool(vector_store_ids=[vector_store_id])
+        definitions += file_search_tool.definitions
+        resources.file_search = file_search_tool.resources['file_search']
+    if CODE_INTERPRETER_TOOL in tool_names:
+        code_interpreter_tool = CodeInterpreterTool(file_ids=file_ids)
+        definitions += code_interpreter_tool.definitions
+        resources.code_interpreter = code_interpreter_tool.resources['code_interpreter']
+    if BING_TOOL in tool_names:
+        bing_connection = project_client.connections.get(
+            connection_name=os.environ[BING_CONNECTION_NAME_ENV]
+        )
+        definitions += BingGroundingTool(connection_id=bing_connection.id).definitions
+    return definitions, resources
+
+
+def collect_response(project_client, thread_id, output_dir=None):
+    """
+    Returns the assistant's last text response and saves any files it generated to ``output_dir``.
+    """
+    messages = project_client.agents.list_messages(thread_id=thread_id)
+    last_msg = messages.get_last_message_by_role("assistant")
+    response = {"text": None, "files": []}
+    if not last_msg:
+        return response
+
+    if hasattr(last_msg, 'text_messages') and last_msg.text_messages:
+        response["text"] = last_msg.text_messages[-1].text.value
+
+    if output_dir and hasattr(last_msg, 'file_path_annotations'):
+        for annotation in last_msg.file_path_annotations:
+            file_info = annotation.file_path
+            file_id = file_info.get('file_id')
+            if file_id:
+                file_name = os.path.basename(annotation.text) or f"{file_id}.png"
+                project_client.agents.save_file(
+                    file_id=file_id,
+                    file_name=file_name,
+                    target_dir=output_dir
+                )
+                response["files"].append(os.path.join(output_dir, file_name))
+    return response
+
+
+def wait_for_run(project_client, thread_id, run_id, interval=None):
+    """
+    Polls a run until it reaches a terminal status and returns it.
+
+    :param interval: Seconds between polls. Defaults to ``RUN_POLL_INTERVAL``, or 0 during a replay.
+    """
+    if interval is None:
+        interval = poll_interval(RUN_POLL_INTERVAL)
+    run = project_client.agents.get_run(thread_id=thread_id, run_id=run_id)
+    while run.status not in TERMINAL_RUN_STATUSES:
+        time.sleep(interval)
+        run = project_client.agents.get_run(thread_id=thread_id, run_id=run_id)
+    return run
+
+
+def _exists(project_client, kind, resource_id):
+    try:
+        getattr(project_client.agents, _GETTERS[kind])(resource_id)
+    except ResourceNotFoundError:
+        return False
+    return True
+
+
+def _restore(project_client, checkpoint, kind, key, *dependents):
+    """
+    Returns the checkpointed resource ID stored under ``key`` if the resource still exists.
+
+    Checkpointed resources may have been deleted since, for example by the ledger's collector once
+    their TTL passed. A missing resource is forgotten along with the ``dependents`` built on it, so
+    the stages that create them run again.
+    """
+    resource_id = checkpoint.get(key)
+    if not resource_id:
+        return None
+    if not _exists(project_client, kind, resource_id):
+        checkpoint.forget(key, *dependents)
+        return None
+    # The resource is still in use, so keep the collector away from it
+    get_ledger().extend(resource_id)
+    return resource_id
+
+
+def _unrecorded_run(project_client, thread_id):
+    """
+    Returns the ID of the thread's latest run unless it was unsuccessful.
+
+    A job that stopped after the service accepted its run, but before the run was recorded, finds the
+    run here. Submitting another one would be rejected while the first is active, or run the prompt twice.
+    """
+    runs = project_client.agents.list_runs(thread_id=thread_id, limit=1)
+    for run in runs.data:
+        if run.status not in UNSUCCESSFUL_RUN_STATUSES:
+            return run.id
+    return None
+
+
+def _run_stages(project_client, spec, checkpoint):
+    """
+    Runs every stage of a job that the checkpoint does not already record as completed.
+    """
+    # A submitted run only needs its thread; without the thread, the message and run are redone
+    thread_id = _restore(project_client, checkpoint, KIND_THREAD, "thread_id", "message_id", "run_id")
+    if thread_id and checkpoint.get("message_id") and not checkpoint.get("run_id"):
+        run_id = _unrecorded_run(project_client, thread_id)
+        if run_id:
+            checkpoint.record(STAGE_RUN_SUBMITTED, run_id=run_id)
+    if not checkpoint.get("run_id"):
+        agent_id = _prepare_agent(project_client, spec, checkpoint)
+
+        if not thread_id:
+            thread_id = project_client.agents.create_thread().id
+            checkpoint.record(STAGE_THREAD_CREATED, thread_id=thread_id)
+
+        if not checkpoint.get("message_id"):
+            message = project_client.agents.create_message(
+                thread_id=thread_id,
+                role="user",
+                content=spec["prompt"]
+            )
+            checkpoint.record(STAGE_MESSAGE_CREATED, message_id=message.id)
+
+        # Submit the run once; a resumed job polls the run it already submitted
+        run = project_client.agents.create_run(thread_id=thread_id, assistant_id=agent_id)
+        checkpoint.record(STAGE_RUN_SUBMITTED, run_id=run.id)
+    run = wait_for_run(project_client, thread_id, checkpoint.get("run_id"))
+    record_run(project_client, run, FLOW_NAME, spec.get("tenant"))
+
+    result = {
+        "status": run.status,
+        "run_id": run.id,
+        "thread_id": thread_id,
+        "usage": dict(run.usage) if getattr(run, "usage", None) else None,
+    }
+    if run.status == "failed":
+        result["error"] = str(run.last_error)
+    else:
+        result.update(collect_response(project_client, thread_id, spec.get("output_dir")))
+    checkpoint.record(STAGE_COMPLETED, result=result)
+    return result
+
+
+def _prepare_agent(project_client, spec, checkpoint):
+    """
+    Uploads the input files, indexes them and creates the agent, reusing what the checkpoint holds.
+
+    :return: The agent ID.
+    """
+    agent_spec = spec.get("agent", {})
+    tool_names = agent_spec.get("tools", [])
+
+    # Upload input files one by one, so a crash mid-batch only repeats the file in flight
+    file_ids = dict(checkpoint.get("file_ids") or {})
+    missing = [path for path, file_id in file_ids.items() if not _exists(project_client, KIND_FILE, file_id)]
+    if missing:
+        # The vector store and agent were built on the deleted files
+        checkpoint.forget("vector_store_id", "agent_id")
+        for path in missing:
+            del file_ids[path]
+    for file_id in file_ids.values():
+        get_ledger().extend(file_id)
+    for path in spec.get("files", []):
+        if path in file_ids:
+            continue
+        uploaded_file = project_client.agents.upload_file_and_poll(
+            file_path=path,
+            purpose=FilePurpose.AGENTS,
+            sleep_interval=poll_interval()
+        )
+        file_ids[path] = uploaded_file.id
+        checkpoint.record(STAGE_FILE_UPLOADED, file_ids=dict(file_ids))
+
+    # Index the files if file search is requested
+    vector_store_id = _restore(project_client, checkpoint, KIND_VECTOR_STORE, "vector_store_id", "agent_id")
+    if not vector_store_id and FILE_SEARCH_TOOL in tool_names:
+        vector_store = project_client.agents.create_vector_store_and_poll(
+            file_ids=list(file_ids.values()),
+            name=VECTOR_STORE_NAME,
+            sleep_interval=poll_interval()
+        )
+        vector_store_id = vector_store.id
+        checkpoint.record(STAGE_VECTOR_STORE_CREATED, vector_store_id=vector_store_id)
+
+    agent_id = _restore(project_client, checkpoint, KIND_AGENT, "agent_id")
+    if agent_id:
+        return agent_id
+
+    # Apply the tenant's token budget before the agent is created
+    agent_model = select_model(agent_spec.get("model", DEFAULT_AGENT_MODEL), FLOW_NAME, spec.get("tenant"))
+    tool_definitions, tool_resources = build_tools(
+        project_client, tool_names, list(file_ids.values()), vector_store_id
+    )
+    agent = project_client.agents.create_agent(
+        model=agent_model,
+        name=agent_spec.get("name", DEFAULT_AGENT_NAME),
+        instructions=agent_spec.get("instructions", DEFAULT_AGENT_INSTRUCTIONS),
+        tools=tool_definitions,
+        tool_resources=tool_resources,
+        headers={"x-ms-enable-preview": "true"}
+    )
+    checkpoint.record(STAGE_AGENT_CREATED, agent_id=agent.id)
+    return agent.id
+
+
+def _clean_up(project_client, checkpoint):
+    """
+    Deletes everything the job created. Resources that are already gone are skipped, so this is safe to repeat.
+    """
+    deletions = []
+    if checkpoint.get("vector_store_id"):
+        deletions.append((project_client.agents.delete_vector_store, checkpoint.get("vector_store_id")))
+    for file_id in checkpoint.get("file_ids", {}).values():
+        deletions.append((project_client.agents.delete_file, file_id))
+    if checkpoint.get("agent_id"):
+        deletions.append((project_client.agents.delete_agent, checkpoint.get("agent_id")))
+    if checkpoint.get("thread_id"):
+        deletions.append((project_client.agents.delete_thread, checkpoint.get("thread_id")))
+    for delete, resource_id in deletions:
+        try:
+            delete(resource_id)
+        except ResourceNotFoundError:
+            pass
+
+
+def run_agent_job(project_client, spec, checkpoint=None):
+    """
+    Runs one job: uploads its files, creates the agent and thread, runs the prompt and cleans up.
+
+    With a durable ``checkpoint`` every completed stage is logged, and a job that is run again resumes
+    from its last completed stage. Uploads, agents and threads are reused, and a run that was already
+    submitted is polled instead of being started again. Resources are kept when a checkpointed job
+    fails, so that the retry can reuse them. Without a checkpoint, everything is cleaned up on failure.
+
+    :param project_client: The AIProjectClient to use.
+    :param spec: The job specification.
+    :param checkpoint: Optional ``checkpoint.JobCheckpoint`` to record and resume progress.
+    :return: A dictionary with the run status, response text, generated files and token usage.
+    """
+    checkpoint = checkpoint or JobCheckpoint()
+    # A finished job is not run again, so its inputs no longer have to exist
+    if checkpoint.stage == STAGE_CLEANED_UP:
+        return checkpoint.get("result")
+    validate_job_spec(spec)
+
+    try:
+        result = checkpoint.get("result")
+        if result is None:
+            result = _run_stages(project_client, spec, checkpoint)
+    except Exception:
+        if not checkpoint.durable:
+            _clean_up(project_client, checkpoint)
+        raise
+
+    _clean_up(project_client, checkpoint)
+    checkpoint.record(STAGE_CLEANED_UP)
+    return result
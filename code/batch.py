@@ -0,0 +1,119 @@
+"""
+Runs a batch of agent jobs with checkpointing, so a crashed batch resumes where it stopped.
+
+Example (run from the repository root)::
+
+    python code/batch.py jobs.jsonl --checkpoint batch.checkpoint.jsonl --results batch.results.jsonl
+
+``jobs.jsonl`` holds one job specification per line, in the format described in ``agent_flows``. An
+optional ``id`` field names the job; otherwise an ID is derived from the line number and content. Run
+the same command again after a crash: finished jobs are skipped, and unfinished jobs continue from
+their last completed stage. Uploaded files, vector stores, agents and threads are reused, and runs
+that were already submitted are polled rather than resubmitted.
+"""
+import argparse
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+from azure.identity import DefaultAzureCredential
+
+from agent_flows import run_agent_job
+from checkpoint import STAGE_CLEANED_UP, CheckpointLog
+from metrics import export_metrics
+from project_client import create_project_client
+
+# === Environment Variables ===
+PROJECT_CONNECTION_STRING_ENV = "PROJECT_CONNECTION_STRING"
+
+# === Operational Constants ===
+DEFAULT_CHECKPOINT_PATH = "./batch.checkpoint.jsonl"
+DEFAULT_CONCURRENCY = 1
+
+
+def job_id_for(index, spec):
+    """
+    Returns the job's own ``id`` or a stable ID derived from its position and content.
+    """
+    if spec.get("id"):
+        return str(spec["id"])
+    digest = hashlib.sha256(json.dumps(spec, sort_keys=True).encode("utf-8")).hexdigest()
+    return f"job-{index}-{digest[:12]}"
+
+
+def run_batch(project_client, jobs, log, concurrency):
+    """
+    Runs every job that the checkpoint log does not record as finished.
+
+    :return: A dictionary mapping job IDs to their results, or to ``{"error": ...}`` for failed jobs.
+    """
+    states = log.load()
+    results = {}
+
+    def run_one(job_id, spec):
+        checkpoint = log.job(job_id, states)
+        if checkpoint.stage == STAGE_CLEANED_UP:
+            print(f"Job {job_id}: already finished, skipping.")
+        elif checkpoint.stage:
+            print(f"Job {job_id}: resuming after stage '{checkpoint.stage}'...")
+        else:
+            print(f"Job {job_id}: starting...")
+        try:
+            result = run_agent_job(project_client, spec, checkpoint)
+        except Exception as e:
+            print(f"Job {job_id}: failed after stage '{checkpoint.stage}': {e}")
+            return job_id, {"error": str(e)}
+        print(f"Job {job_id}: finished with status {result['status']}.")
+        return job_id, result
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for job_id, result in executor.map(lambda job: run_one(*job), jobs):
+            results[job_id] = result
+    return results
+
+
+def main():
+    """
+    Loads the batch, runs it with checkpointing and writes the results.
+    """
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Run a checkpointed batch of agent jobs.")
+    parser.add_argument("jobs", help="A JSON Lines file with one job specification per line.")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT_PATH, help="Path to the checkpoint log.")
+    parser.add_argument("--results", help="Optional JSON Lines file to write the results to.")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="Jobs to run at once.")
+    args = parser.parse_args()
+
+    project_conn_str = os.environ.get(PROJECT_CONNECTION_STRING_ENV)
+    if not project_conn_str:
+        raise EnvironmentError(
+            f"Environment variable '{PROJECT_CONNECTION_STRING_ENV}' is not set."
+        )
+
+    with open(args.jobs, encoding="utf-8") as jobs_file:
+        specs = [json.loads(line) for line in jobs_file if line.strip()]
+    jobs = [(job_id_for(index, spec), spec) for index, spec in enumerate(specs)]
+    print(f"Loaded {len(jobs)} job(s); checkpointing to '{args.checkpoint}'.")
+
+    project_client = create_project_client(
+        credential=DefaultAzureCredential(),
+        conn_str=project_conn_str
+    )
+    with project_client:
+        results = run_batch(project_client, jobs, CheckpointLog(args.checkpoint), args.concurrency)
+    export_metrics()
+
+    if args.results:
+        with open(args.results, "w", encoding="utf-8") as results_file:
+            for job_id, _ in jobs:
+                results_file.write(json.dumps({"job_id": job_id, "result": results[job_id]}) + "\n")
+        print(f"Wrote results to '{args.results}'.")
+
+    failed = sum(1 for result in results.values() if "error" in result)
+    print(f"Batch completed: {len(results) - failed} finished, {failed} failed.")
+
+
+if __name__ == "__main__":
+    main()
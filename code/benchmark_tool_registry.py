@@ -0,0 +1,141 @@
+"""
+Benchmarks function tool start-up cost with FunctionTool and with the cached ToolRegistry.
+
+For registries of 10, 100 and 1000 generated functions, each scenario runs in a fresh Python process,
+so every measurement is a real cold start:
+
+- ``FunctionTool (cold .pyc)``: import the module without cached bytecode and build ``FunctionTool``
+  from its functions, as on the first start after the module changed.
+- ``FunctionTool (warm .pyc)``: the same, with the module's bytecode cached by the previous start, as
+  on every later start.
+- ``ToolRegistry (compile)``: no cached artifact; compile the schemas from source and write the cache.
+- ``ToolRegistry (cached)``: the artifact is up to date and is only loaded.
+
+Run it from the repository root::
+
+    python code/benchmark_tool_registry.py
+"""
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+# === Operational Constants ===
+REGISTRY_SIZES = [10, 100, 1000]
+REPEATS = 5
+MODULE_NAME = "generated_tools"
+
+FUNCTION_TEMPLATE = '''
+def tool_{index}(location: str, days: int = 1, units: Optional[str] = None) -> str:
+    """
+    Returns a forecast for a location (tool {index}).
+
+    :param location (str): The location to fetch the forecast for.
+    :param days (int): Number of days to forecast.
+    :param units (str): Optional unit system.
+    :return: The forecast as a JSON string.
+    :rtype: str
+    """
+    return json.dumps({{"tool": {index}, "location": location, "days": days, "units": units}})
+'''
+
+FUNCTION_TOOL_SCENARIO = """
+import time
+start = time.perf_counter()
+import inspect
+import {module}
+from azure.ai.projects.models import FunctionTool
+functions = {{f for name, f in vars({module}).items() if inspect.isfunction(f) and f.__module__ == "{module}"}}
+definitions = FunctionTool(functions).definitions
+print(time.perf_counter() - start)
+"""
+
+REGISTRY_SCENARIO = """
+import time
+start = time.perf_counter()
+from tool_registry import ToolRegistry
+registry = ToolRegistry(cache_dir={cache_dir!r})
+registry.register_module("{module}")
+definitions = registry.definitions
+print(time.perf_counter() - start)
+"""
+
+
+def write_module(directory, size):
+    """
+    Writes a module with ``size`` function tools to ``directory``.
+    """
+    with open(os.path.join(directory, f"{MODULE_NAME}.py"), "w", encoding="utf-8") as module_file:
+        module_file.write("import json\nfrom typing import Optional\n")
+        for index in range(size):
+            module_file.write(FUNCTION_TEMPLATE.format(index=index))
+
+
+def time_scenario(script, directory):
+    """
+    Runs a scenario in a fresh interpreter and returns the seconds it reported.
+    """
+    code_dir = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([directory, code_dir]))
+    output = subprocess.run(
+        [sys.executable, "-c", script],
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True
+    )
+    return float(output.stdout.strip().splitlines()[-1])
+
+
+def benchmark(size):
+    """
+    Returns the median start-up time in milliseconds of each scenario for one registry size.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        write_module(directory, size)
+        cache_dir = os.path.join(directory, "cache")
+        cache_path = os.path.join(cache_dir, f"{MODULE_NAME}.json")
+        registry_script = REGISTRY_SCENARIO.format(cache_dir=cache_dir, module=MODULE_NAME)
+        function_tool_script = FUNCTION_TOOL_SCENARIO.format(module=MODULE_NAME)
+
+        function_tool_cold, function_tool_warm, compiled, cached = [], [], [], []
+        for _ in range(REPEATS):
+            shutil.rmtree(os.path.join(directory, "__pycache__"), ignore_errors=True)
+            function_tool_cold.append(time_scenario(function_tool_script, directory))
+            # The cold start wrote the module's bytecode, so this start loads it
+            function_tool_warm.append(time_scenario(function_tool_script, directory))
+            if os.path.exists(cache_path):
+                os.remove(cache_path)
+            compiled.append(time_scenario(registry_script, directory))
+            cached.append(time_scenario(registry_script, directory))
+
+    return {
+        "functions": size,
+        "FunctionTool (cold .pyc)": statistics.median(function_tool_cold) * 1000,
+        "FunctionTool (warm .pyc)": statistics.median(function_tool_warm) * 1000,
+        "ToolRegistry (compile)": statistics.median(compiled) * 1000,
+        "ToolRegistry (cached)": statistics.median(cached) * 1000,
+    }
+
+
+def main():
+    print(f"Start-up time in milliseconds (median of {REPEATS} fresh processes):")
+    columns = [
+        "functions", "FunctionTool (cold .pyc)", "FunctionTool (warm .pyc)", "ToolRegistry (compile)",
+        "ToolRegistry (cached)"
+    ]
+    print("".join(f"{column:>26}" for column in columns))
+    results = []
+    for size in REGISTRY_SIZES:
+        result = benchmark(size)
+        results.append(result)
+        print(f"{result['functions']:>26}" + "".join(f"{result[column]:>26.1f}" for column in columns[1:]))
+    if "--json" in sys.argv:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
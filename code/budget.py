@@ -0,0 +1,180 @@
+"""
+Per-tenant token budgets for agent runs.
+
+Token usage reported by finished runs is charged to the tenant that started them, in a SQLite file
+shared by every script and worker process on the machine. Before a new run, ``TokenBudget.select_model``
+checks the tenant's usage over the rolling budget window. Once a tenant passes the downgrade threshold,
+agents are created with a cheaper model deployment where one is configured. Once it reaches its budget,
+new runs are rejected with ``BudgetExceededError``.
+
+Budgets are configured with ``AGENT_TOKEN_BUDGETS``, for example ``team-a=200000,team-b=50000,*=100000``,
+where ``*`` applies to any tenant not listed. Without budgets nothing is enforced or stored.
+"""
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing, contextmanager
+
+# === Environment Variables ===
+TENANT_ENV = "AGENT_TENANT"
+TOKEN_BUDGETS_ENV = "AGENT_TOKEN_BUDGETS"
+BUDGET_WINDOW_ENV = "AGENT_BUDGET_WINDOW"
+BUDGET_PATH_ENV = "AGENT_BUDGET_PATH"
+DOWNGRADE_AT_ENV = "AGENT_BUDGET_DOWNGRADE_AT"
+MODEL_DOWNGRADES_ENV = "AGENT_MODEL_DOWNGRADES"
+
+# === Defaults ===
+DEFAULT_TENANT = "default"
+DEFAULT_BUDGET_PATH = "./.agent_budget.sqlite3"
+DEFAULT_BUDGET_WINDOW = 86400  # Seconds of usage counted against a budget
+DEFAULT_DOWNGRADE_AT = 0.8  # Fraction of the budget after which cheaper models are used
+DEFAULT_MODEL_DOWNGRADES = {"gpt-4o": "gpt-4o-mini"}
+ANY_TENANT = "*"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS usage (
+    tenant TEXT NOT NULL,
+    recorded_at REAL NOT NULL,
+    tokens INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_usage_tenant ON usage (tenant, recorded_at);
+"""
+
+
+class BudgetExceededError(Exception):
+    """
+    Raised when a tenant has used up its token budget for the current window.
+    """
+
+    def __init__(self, tenant, used, limit):
+        super().__init__(f"Tenant '{tenant}' has used {used} of its {limit} token budget.")
+        self.tenant = tenant
+        self.used = used
+        self.limit = limit
+
+
+def default_tenant():
+    """
+    Returns the tenant that runs started by this process are charged to.
+    """
+    return os.environ.get(TENANT_ENV) or DEFAULT_TENANT
+
+
+def parse_mapping(value, convert=str):
+    """
+    Parses a ``key=value,key=value`` setting into a dictionary.
+    """
+    mapping = {}
+    for item in (value or "").split(","):
+        key, separator, item_value = item.partition("=")
+        if separator and key.strip():
+            mapping[key.strip()] = convert(item_value.strip())
+    return mapping
+
+
+class TokenBudget:
+    """
+    Rolling-window token budgets per tenant.
+
+    :param path: Path to the SQLite database that usage is recorded in.
+    :param limits: Dictionary mapping tenants, or ``*`` for any other tenant, to token budgets.
+    :param window: Seconds of past usage counted against a budget.
+    :param downgrade_at: Fraction of the budget after which models are downgraded.
+    :param downgrades: Dictionary mapping model deployments to cheaper replacements.
+    """
+
+    def __init__(self, path=DEFAULT_BUDGET_PATH, limits=None, window=DEFAULT_BUDGET_WINDOW,
+                 downgrade_at=DEFAULT_DOWNGRADE_AT, downgrades=None):
+        self.path = path
+        self.limits = dict(limits or {})
+        self.window = window
+        self.downgrade_at = downgrade_at
+        self.downgrades = DEFAULT_MODEL_DOWNGRADES if downgrades is None else dict(downgrades)
+        self._initialized = False
+        self._init_lock = threading.Lock()
+
+    @contextmanager
+    def _connect(self):
+        # The database is only created once a budget actually needs it
+        with self._init_lock:
+            if not self._initialized:
+                with closing(sqlite3.connect(self.path, timeout=30, isolation_level=None)) as connection:
+                    connection.execute("PRAGMA journal_mode=WAL")
+                    connection.executescript(_SCHEMA)
+                self._initialized = True
+        with closing(sqlite3.connect(self.path, timeout=30, isolation_level=None)) as connection:
+            yield connection
+
+    def limit(self, tenant):
+        """
+        Returns the tenant's token budget, or None if it has none.
+        """
+        return self.limits.get(tenant, self.limits.get(ANY_TENANT))
+
+    def used(self, tenant):
+        """
+        Returns the tokens the tenant has used in the current window.
+        """
+        if self.limit(tenant) is None:
+            return 0
+        with self._connect() as connection:
+            row = connection.execute(
+                "SELECT COALESCE(SUM(tokens), 0) FROM usage WHERE tenant = ? AND recorded_at > ?",
+                (tenant, time.time() - self.window)
+            ).fetchone()
+        return row[0]
+
+    def charge(self, tenant, tokens):
+        """
+        Records tokens used by one of the tenant's runs.
+        """
+        if not tokens or self.limit(tenant) is None:
+            return
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT INTO usage (tenant, recorded_at, tokens) VALUES (?, ?, ?)",
+                (tenant, time.time(), int(tokens))
+            )
+            # Usage older than the window can never count again
+            connection.execute("DELETE FROM usage WHERE recorded_at <= ?", (time.time() - self.window,))
+
+    def select_model(self, model, tenant=None):
+        """
+        Returns the model deployment to use for a new run of ``tenant``.
+
+        :raises BudgetExceededError: If the tenant has used up its budget.
+        :return: ``model``, or its cheaper replacement once the tenant passes the downgrade threshold.
+        """
+        tenant = tenant or default_tenant()
+        limit = self.limit(tenant)
+        if limit is None:
+            return model
+        used = self.used(tenant)
+        if used >= limit:
+            raise BudgetExceededError(tenant, used, limit)
+        if used >= limit * self.downgrade_at:
+            return self.downgrades.get(model, model)
+        return model
+
+
+_budget = None
+_budget_lock = threading.Lock()
+
+
+def get_budget():
+    """
+    Returns the process-wide token budget, creating it from the environment on first use.
+    """
+    global _budget
+    with _budget_lock:
+        if _budget is None:
+            downgrades = parse_mapping(os.environ.get(MODEL_DOWNGRADES_ENV))
+            _budget = TokenBudget(
+                path=os.environ.get(BUDGET_PATH_ENV, DEFAULT_BUDGET_PATH),
+                limits=parse_mapping(os.environ.get(TOKEN_BUDGETS_ENV), int),
+                window=int(os.environ.get(BUDGET_WINDOW_ENV, DEFAULT_BUDGET_WINDOW)),
+                downgrade_at=float(os.environ.get(DOWNGRADE_AT_ENV, DEFAULT_DOWNGRADE_AT)),
+                downgrades=downgrades or None
+            )
+        return _budget
@@ -0,0 +1,145 @@
+"""
+Append-only checkpoint log for long batches of agent jobs.
+
+Each completed stage of a job is appended to a JSON Lines file with the IDs it produced (uploaded
+files, vector store, agent, thread and run). After a crash the log is replayed to find the last
+completed stage of every job, so a restarted batch reuses what already exists instead of redoing it.
+"""
+import json
+import os
+import threading
+import time
+
+# === Job Stages ===
+STAGE_FILE_UPLOADED = "file_uploaded"
+STAGE_VECTOR_STORE_CREATED = "vector_store_created"
+STAGE_AGENT_CREATED = "agent_created"
+STAGE_THREAD_CREATED = "thread_created"
+STAGE_MESSAGE_CREATED = "message_created"
+STAGE_RUN_SUBMITTED = "run_submitted"
+STAGE_COMPLETED = "completed"
+STAGE_CLEANED_UP = "cleaned_up"
+
+
+class CheckpointLog:
+    """
+    A JSON Lines file that job stages are appended to and replayed from.
+
+    :param path: Path to the checkpoint file. It is created on the first write.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._tail_repaired = False
+
+    def _repair_tail(self):
+        """
+        Cuts off a final line left incomplete by a crash, so the next record starts on a line of its own.
+        """
+        try:
+            log_file = open(self.path, "r+b")
+        except FileNotFoundError:
+            return
+        with log_file:
+            size = log_file.seek(0, os.SEEK_END)
+            end = size
+            while end > 0:
+                start = max(0, end - 4096)
+                log_file.seek(start)
+                newline = log_file.read(end - start).rfind(b"\n")
+                if newline != -1:
+                    end = start + newline + 1
+                    break
+                end = start
+            if end != size:
+                log_file.truncate(end)
+                log_file.flush()
+                os.fsync(log_file.fileno())
+
+    def append(self, job_id, stage, data):
+        """
+        Durably appends one stage record. The write is flushed and synced before returning.
+        """
+        line = json.dumps({"job_id": job_id, "stage": stage, "data": data, "at": time.time()})
+        with self._lock:
+            if not self._tail_repaired:
+                self._repair_tail()
+                self._tail_repaired = True
+            with open(self.path, "a", encoding="utf-8") as log_file:
+                log_file.write(line + "\n")
+                log_file.flush()
+                os.fsync(log_file.fileno())
+
+    def load(self):
+        """
+        Replays the log into the latest state of every job.
+
+        A final line left incomplete by a crash is ignored.
+
+        :return: A dictionary mapping job IDs to ``{"stage": ..., "data": {...}}``.
+        """
+        states = {}
+        if not os.path.exists(self.path):
+            return states
+        with open(self.path, encoding="utf-8") as log_file:
+            for line in log_file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                state = states.setdefault(record["job_id"], {"stage": None, "data": {}})
+                state["stage"] = record["stage"]
+                state["data"].update(record["data"])
+        return states
+
+    def job(self, job_id, states=None):
+        """
+        Returns a ``JobCheckpoint`` for one job, restored from ``states`` or from the log.
+        """
+        states = self.load() if states is None else states
+        return JobCheckpoint(job_id, self, states.get(job_id))
+
+
+class JobCheckpoint:
+    """
+    The checkpointed state of a single job.
+
+    Without a log the state is only kept in memory, which lets flows use the same code path whether
+    or not they are checkpointed.
+
+    :param job_id: The job's ID.
+    :param log: The ``CheckpointLog`` to append to, or None to keep state in memory only.
+    :param state: State restored from the log, as returned by ``CheckpointLog.load``.
+    """
+
+    def __init__(self, job_id=None, log=None, state=None):
+        self.job_id = job_id
+        self._log = log
+        self.stage = state["stage"] if state else None
+        self.data = dict(state["data"]) if state else {}
+
+    @property
+    def durable(self):
+        return self._log is not None
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    def record(self, stage, **data):
+        """
+        Marks ``stage`` as completed and stores the IDs it produced.
+        """
+        if self._log is not None:
+            self._log.append(self.job_id, stage, data)
+        self.stage = stage
+        self.data.update(data)
+
+    def forget(self, *keys):
+        """
+        Clears stored IDs, so the stages that produced them run again. Cleared keys are logged as None.
+        """
+        data = {key: None for key in keys}
+        if self._log is not None:
+            self._log.append(self.job_id, self.stage, data)
+        self.data.update(data)
@@ -1,56 +1,94 @@
 import os  
+import time
 from dotenv import load_dotenv
-from azure.ai.projects import AIProjectClient  
 from azure.identity import DefaultAzureCredential  
+from project_client import create_project_client
+from resource_ledger import BackgroundCollector, collect_expired, get_ledger
 
 # Set to True to only display resources without deleting them
 # Set to False to actually delete resources
 DRY_RUN = False
 
+# Set to True to keep collecting expired resources in the background until interrupted
+WATCH = False
+WATCH_INTERVAL = 60  # Seconds between collection passes
+BATCH_SIZE = 20
+
+# Set to True to delete EVERY agent, file and vector store in the project, including
+# resources other workers are still using. Only use this on a project nobody else shares.
+PURGE_ALL = False
+
 # Load environment variables from .env file
 print("Loading environment variables...")
 load_dotenv()
 
 # Initialize the AI Project Client  
 project_conn_str = os.environ.get("PROJECT_CONNECTION_STRING")
-project_client = AIProjectClient.from_connection_string(  
+project_client = create_project_client(  
     credential=DefaultAzureCredential(),  
     conn_str=project_conn_str
 )  
 
 mode = "Displaying" if DRY_RUN else "Cleaning up"
 
-# Agents
-print(f"{mode} agents...")
-agents = project_client.agents.list_agents()
-
-for agent in agents.data:
-    print(agent.id, agent.name)
-    if not DRY_RUN:
-        project_client.agents.delete_agent(agent.id)
-        print(f"Deleted agent {agent.id}")
-
-# Files
-print(f"\n{mode} files...")
-files = project_client.agents.list_files()
-
-for file in files.data:
-    print(file.id)
-    if not DRY_RUN:
-        project_client.agents.delete_file(file.id)
-        print(f"Deleted file {file.id}")
-
-# Vector stores
-print(f"\n{mode} vector stores...")
-vector_stores = project_client.agents.list_vector_stores()
-
-for vector_store in vector_stores.data:
-    print(vector_store.id, vector_store.name)
-    if not DRY_RUN:
-        project_client.agents.delete_vector_store(vector_store.id)
-        print(f"Deleted vector store {vector_store.id}")
-
-if DRY_RUN:
-    print("\nDry run completed. No resources were deleted.")
+if PURGE_ALL:
+    # Agents
+    print(f"{mode} agents...")
+    agents = project_client.agents.list_agents()
+
+    for agent in agents.data:
+        print(agent.id, agent.name)
+        if not DRY_RUN:
+            project_client.agents.delete_agent(agent.id)
+            print(f"Deleted agent {agent.id}")
+
+    # Files
+    print(f"\n{mode} files...")
+    files = project_client.agents.list_files()
+
+    for file in files.data:
+        print(file.id)
+        if not DRY_RUN:
+            project_client.agents.delete_file(file.id)
+            print(f"Deleted file {file.id}")
+
+    # Vector stores
+    print(f"\n{mode} vector stores...")
+    vector_stores = project_client.agents.list_vector_stores()
+
+    for vector_store in vector_stores.data:
+        print(vector_store.id, vector_store.name)
+        if not DRY_RUN:
+            project_client.agents.delete_vector_store(vector_store.id)
+            print(f"Deleted vector store {vector_store.id}")
+
+    if DRY_RUN:
+        print("\nDry run completed. No resources were deleted.")
+    else:
+        print("\nCleanup completed successfully. All resources were deleted.")
+
 else:
-    print("\nCleanup completed successfully. All resources were deleted.")
\ No newline at end of file
+    # Only resources recorded in the local ledger whose TTL has passed are touched,
+    # so resources that other workers are still using are left alone
+    ledger = get_ledger()
+
+    if DRY_RUN:
+        print(f"{mode} expired resources recorded in '{ledger.path}'...")
+        for resource in ledger.expired():
+            print(resource["kind"], resource["resource_id"], resource["owner"], resource["tags"])
+        print("\nDry run completed. No resources were deleted.")
+
+    elif WATCH:
+        print(f"Collecting expired resources every {WATCH_INTERVAL} seconds. Press Ctrl+C to stop...")
+        with BackgroundCollector(project_client, ledger, interval=WATCH_INTERVAL, batch_size=BATCH_SIZE) as collector:
+            try:
+                while True:
+                    time.sleep(1)
+            except KeyboardInterrupt:
+                print("Stopping collector...")
+        print(f"\nCollector stopped. {collector.deleted} expired resources were deleted.")
+
+    else:
+        print(f"{mode} expired resources recorded in '{ledger.path}'...")
+        deleted = collect_expired(project_client, ledger, batch_size=BATCH_SIZE)
+        print(f"\nCleanup completed successfully. {deleted} expired resources were deleted.")
@@ -0,0 +1,226 @@
+"""
+Durable local job queue for agent workers, backed by SQLite.
+
+Workers claim jobs with a lease and keep it alive with heartbeats while a job runs. If a worker
+crashes, its lease lapses and the job is handed to another worker, up to ``max_attempts`` times.
+Every state change is a single SQLite transaction, so any number of worker processes on the same
+machine can share one queue file.
+
+To spread workers over several machines, replace ``JobQueue`` with a networked store that offers the
+same methods (``enqueue``, ``claim``, ``heartbeat``, ``complete``, ``fail`` and ``stats``). The lease
+protocol stays the same. SQLite files should not be shared over network file systems.
+"""
+import json
+import sqlite3
+import time
+import uuid
+from contextlib import closing, contextmanager
+
+# === Environment Variables ===
+JOB_QUEUE_PATH_ENV = "AGENT_JOB_QUEUE_PATH"
+
+# === Defaults ===
+DEFAULT_JOB_QUEUE_PATH = "./.agent_jobs.sqlite3"
+DEFAULT_LEASE_SECONDS = 120
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_THROUGHPUT_WINDOW = 300  # Seconds of finished jobs used to compute throughput
+
+# === Job Statuses ===
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_SUCCEEDED = "succeeded"
+STATUS_FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    worker_id TEXT,
+    lease_until REAL,
+    enqueued_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    result TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_claim ON jobs (status, lease_until, enqueued_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_finished ON jobs (finished_at);
+"""
+
+
+class JobQueue:
+    """
+    A durable FIFO queue of agent jobs with lease-based claiming.
+
+    :param path: Path to the SQLite database file.
+    """
+
+    def __init__(self, path=DEFAULT_JOB_QUEUE_PATH):
+        self.path = path
+        with self._transaction() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(_SCHEMA)
+
+    @contextmanager
+    def _transaction(self, immediate=False):
+        # A connection per operation keeps the queue safe to use from worker and heartbeat threads
+        with closing(sqlite3.connect(self.path, timeout=30, isolation_level=None)) as connection:
+            connection.row_factory = sqlite3.Row
+            if immediate:
+                connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield connection
+            except BaseException:
+                if connection.in_transaction:
+                    connection.execute("ROLLBACK")
+                raise
+            if connection.in_transaction:
+                connection.execute("COMMIT")
+
+    def enqueue(self, payload, max_attempts=DEFAULT_MAX_ATTEMPTS, job_id=None):
+        """
+        Adds a job to the queue.
+
+        :param payload: JSON-serialisable job specification.
+        :param max_attempts: How many times the job may be claimed before it is marked failed.
+        :param job_id: Optional ID; a random one is generated if omitted.
+        :return: The job ID.
+        """
+        job_id = job_id or uuid.uuid4().hex
+        with self._transaction() as connection:
+            connection.execute(
+                "INSERT INTO jobs (job_id, payload, status, max_attempts, enqueued_at) VALUES (?, ?, ?, ?, ?)",
+                (job_id, json.dumps(payload), STATUS_QUEUED, max_attempts, time.time())
+            )
+        return job_id
+
+    def claim(self, worker_id, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """
+        Claims the oldest available job, including jobs whose previous worker let its lease lapse.
+
+        Jobs that lapse after their last attempt are marked failed instead of being handed out again.
+
+        :return: The claimed job as a dictionary with a decoded ``payload``, or None if the queue is empty.
+        """
+        now = time.time()
+        with self._transaction(immediate=True) as connection:
+            connection.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, error = 'Lease expired after the last attempt.' "
+                "WHERE status = ? AND lease_until <= ? AND attempts >= max_attempts",
+                (STATUS_FAILED, now, STATUS_RUNNING, now)
+            )
+            row = connection.execute(
+                "SELECT * FROM jobs WHERE status = ? OR (status = ? AND lease_until <= ?) "
+                "ORDER BY enqueued_at LIMIT 1",
+                (STATUS_QUEUED, STATUS_RUNNING, now)
+            ).fetchone()
+            if row is None:
+                return None
+            connection.execute(
+                "UPDATE jobs SET status = ?, worker_id = ?, lease_until = ?, attempts = attempts + 1, "
+                "started_at = ? WHERE job_id = ?",
+                (STATUS_RUNNING, worker_id, now + lease_seconds, now, row["job_id"])
+            )
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["attempts"] += 1
+        job["worker_id"] = worker_id
+        return job
+
+    def heartbeat(self, job_id, worker_id, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """
+        Extends the lease on a running job.
+
+        :return: False if the worker no longer holds the job, in which case it should stop working on it.
+        """
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                "UPDATE jobs SET lease_until = ? WHERE job_id = ? AND worker_id = ? AND status = ?",
+                (time.time() + lease_seconds, job_id, worker_id, STATUS_RUNNING)
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, job_id, worker_id, result):
+        """
+        Stores the result of a job and marks it succeeded.
+
+        :return: False if the worker no longer held the job and the result was discarded.
+        """
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                "UPDATE jobs SET status = ?, result = ?, finished_at = ?, lease_until = NULL "
+                "WHERE job_id = ? AND worker_id = ? AND status = ?",
+                (STATUS_SUCCEEDED, json.dumps(result), time.time(), job_id, worker_id, STATUS_RUNNING)
+            )
+            return cursor.rowcount == 1
+
+    def fail(self, job_id, worker_id, error, retry=True):
+        """
+        Records a failed attempt. The job is queued again unless it is out of attempts or ``retry`` is False.
+
+        :return: False if the worker no longer held the job.
+        """
+        with self._transaction(immediate=True) as connection:
+            row = connection.execute(
+                "SELECT attempts, max_attempts FROM jobs WHERE job_id = ? AND worker_id = ? AND status = ?",
+                (job_id, worker_id, STATUS_RUNNING)
+            ).fetchone()
+            if row is None:
+                return False
+            if retry and row["attempts"] < row["max_attempts"]:
+                connection.execute(
+                    "UPDATE jobs SET status = ?, error = ?, worker_id = NULL, lease_until = NULL WHERE job_id = ?",
+                    (STATUS_QUEUED, str(error), job_id)
+                )
+            else:
+                connection.execute(
+                    "UPDATE jobs SET status = ?, error = ?, finished_at = ?, lease_until = NULL WHERE job_id = ?",
+                    (STATUS_FAILED, str(error), time.time(), job_id)
+                )
+            return True
+
+    def get(self, job_id):
+        """
+        Returns a job with its decoded payload and result, or None if it does not exist.
+        """
+        with self._transaction() as connection:
+            row = connection.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def stats(self, window=DEFAULT_THROUGHPUT_WINDOW):
+        """
+        Returns job counts per status and throughput and latency figures for recently finished jobs.
+
+        :param window: Seconds of finished jobs considered for throughput and latency.
+        """
+        now = time.time()
+        with self._transaction() as connection:
+            counts = {
+                row["status"]: row["count"]
+                for row in connection.execute("SELECT status, COUNT(*) AS count FROM jobs GROUP BY status")
+            }
+            recent = connection.execute(
+                "SELECT COUNT(*) AS finished, "
+                "SUM(CASE WHEN status = ? THEN 1 ELSE 0 END) AS succeeded, "
+                "AVG(finished_at - started_at) AS mean_run_seconds, "
+                "AVG(started_at - enqueued_at) AS mean_wait_seconds "
+                "FROM jobs WHERE finished_at >= ?",
+                (STATUS_SUCCEEDED, now - window)
+            ).fetchone()
+        return {
+            "queued": counts.get(STATUS_QUEUED, 0),
+            "running": counts.get(STATUS_RUNNING, 0),
+            "succeeded": counts.get(STATUS_SUCCEEDED, 0),
+            "failed": counts.get(STATUS_FAILED, 0),
+            "jobs_per_minute": (recent["succeeded"] or 0) * 60.0 / window,
+            "mean_run_seconds": recent["mean_run_seconds"],
+            "mean_wait_seconds": recent["mean_wait_seconds"],
+        }
@@ -0,0 +1,320 @@
+"""
+Token usage and latency accounting for agent runs.
+
+``record_run`` is called with every finished run. It records the prompt and completion tokens from
+``run.usage``, the time the run waited in the service's queue (created to started) and the time it
+spent processing (started to finished), and the tool calls listed in its run steps. Values are kept in
+memory in fixed-bucket histograms and counters, labelled by flow, tenant and model, and charged to the
+tenant's token budget and to the rate limiter's tokens-per-minute bucket.
+
+``select_model`` applies the tenant's budget before a run. ``to_prometheus`` and ``snapshot`` export
+the collected metrics, together with the rate limiter's counters and gauges, as Prometheus text or JSON, and
+``export_metrics`` writes them to the file named by ``AGENT_METRICS_PATH`` when it is set.
+"""
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+
+import throttling
+from budget import BudgetExceededError, default_tenant, get_budget
+
+logger = logging.getLogger(__name__)
+
+# === Environment Variables ===
+METRICS_PATH_ENV = "AGENT_METRICS_PATH"
+
+# === Histogram Buckets ===
+TOKEN_BUCKETS = (64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768, 65536, 131072)
+SECONDS_BUCKETS = (0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300, 600)
+TOOL_CALL_BUCKETS = (0, 1, 2, 4, 8, 16, 32)
+
+COUNTER = "counter"
+HISTOGRAM = "histogram"
+GAUGE = "gauge"
+
+# Metric name -> (type, help text, buckets)
+METRICS = {
+    "agent_runs_total": (COUNTER, "Finished agent runs.", None),
+    "agent_run_prompt_tokens": (HISTOGRAM, "Prompt tokens used per run.", TOKEN_BUCKETS),
+    "agent_run_completion_tokens": (HISTOGRAM, "Completion tokens used per run.", TOKEN_BUCKETS),
+    "agent_run_queue_seconds": (HISTOGRAM, "Seconds a run waited before the service started it.", SECONDS_BUCKETS),
+    "agent_run_processing_seconds": (HISTOGRAM, "Seconds from a run starting to finishing.", SECONDS_BUCKETS),
+    "agent_run_tool_calls": (HISTOGRAM, "Tool calls made per run.", TOOL_CALL_BUCKETS),
+    "agent_tool_calls_total": (COUNTER, "Tool calls made by runs, by tool type.", None),
+    "agent_budget_rejections_total": (COUNTER, "Runs rejected because the tenant's budget was used up.", None),
+    "agent_budget_downgrades_total": (COUNTER, "Runs moved to a cheaper model by the tenant's budget.", None),
+}
+
+# Rate limiter metric -> (Prometheus name, type, help text)
+_RATE_LIMITER_METRICS = {
+    "requests_admitted": ("agent_rate_limiter_requests_admitted_total", COUNTER, "Requests admitted by the rate limiter."),
+    "tokens_admitted": ("agent_rate_limiter_tokens_admitted_total", COUNTER, "Estimated tokens admitted by the rate limiter."),
+    "throttle_events": ("agent_rate_limiter_throttle_events_total", COUNTER, "429 responses received."),
+    "wait_seconds_total": ("agent_rate_limiter_wait_seconds_total", COUNTER, "Seconds requests waited for the rate limiter."),
+    "queue_depth": ("agent_rate_limiter_queue_depth", GAUGE, "Requests waiting for the rate limiter."),
+    "requests_available": ("agent_rate_limiter_requests_available", GAUGE, "Requests left in the per-minute bucket."),
+    "tokens_available": ("agent_rate_limiter_tokens_available", GAUGE, "Tokens left in the per-minute bucket."),
+}
+
+
+class Histogram:
+    """
+    Counts observations into fixed buckets, so observing a value is a single binary search.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # The last slot is the +Inf bucket
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """
+        Returns ``(upper_bound, count)`` pairs with Prometheus ``le`` semantics, ending with ``+Inf``.
+        """
+        total = 0
+        pairs = []
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            pairs.append((bound, total))
+        return pairs
+
+
+class MetricsRegistry:
+    """
+    Thread-safe, in-memory store of the counters and histograms declared in ``METRICS``.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series = {}  # (name, sorted label items) -> float or Histogram
+
+    def increment(self, name, labels, value=1):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._series.get(key)
+            if histogram is None:
+                histogram = self._series[key] = Histogram(METRICS[name][2])
+            histogram.observe(value)
+
+    def _collect(self):
+        # Copy under the lock, so exporting never blocks recording for long
+        with self._lock:
+            series = {}
+            for (name, labels), value in self._series.items():
+                if isinstance(value, Histogram):
+                    copy = Histogram(value.buckets)
+                    copy.counts, copy.sum, copy.count = list(value.counts), value.sum, value.count
+                    value = copy
+                series.setdefault(name, []).append((dict(labels), value))
+        return series
+
+    def snapshot(self):
+        """
+        Returns every metric as a JSON-serialisable dictionary.
+        """
+        metrics = {}
+        for name, series in sorted(self._collect().items()):
+            metrics[name] = [
+                {
+                    "labels": labels,
+                    **({
+                        "count": value.count,
+                        "sum": value.sum,
+                        "buckets": {_format_bound(bound): count for bound, count in value.cumulative()},
+                    } if isinstance(value, Histogram) else {"value": value})
+                }
+                for labels, value in series
+            ]
+        return {"timestamp": time.time(), "metrics": metrics, "rate_limiter": _rate_limiter_metrics()}
+
+    def to_prometheus(self):
+        """
+        Returns every metric in the Prometheus text exposition format.
+        """
+        lines = []
+        for name, series in sorted(self._collect().items()):
+            metric_type, help_text, _ = METRICS[name]
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for labels, value in series:
+                if not isinstance(value, Histogram):
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+                    continue
+                for bound, count in value.cumulative():
+                    bucket_labels = _format_labels(dict(labels, le=_format_bound(bound)))
+                    lines.append(f"{name}_bucket{bucket_labels} {count}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(value.sum)}")
+                lines.append(f"{name}_count{_format_labels(labels)} {value.count}")
+
+        limiter = _rate_limiter_metrics()
+        for key, (name, metric_type, help_text) in _RATE_LIMITER_METRICS.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            lines.append(f"{name} {_format_value(limiter[key])}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_bound(bound):
+    return "+Inf" if bound == float("inf") else _format_value(bound)
+
+
+def _format_value(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _rate_limiter_metrics():
+    metrics = throttling.get_rate_limiter().metrics()
+    return {key: metrics[key] for key in _RATE_LIMITER_METRICS}
+
+
+def _status(status):
+    # Run statuses may be enum members or plain strings
+    return getattr(status, "value", status)
+
+
+def count_tool_calls(project_client, thread_id, run_id):
+    """
+    Counts the tool calls in a run's steps by tool type, e.g. ``{"file_search": 1}``.
+    """
+    counts = {}
+    run_steps = project_client.agents.list_run_steps(thread_id=thread_id, run_id=run_id, limit=100)
+    for step in run_steps.data:
+        if step.type != "tool_calls":
+            continue
+        for tool_call in step.step_details.tool_calls:
+            counts[tool_call.type] = counts.get(tool_call.type, 0) + 1
+    return counts
+
+
+def record_run(project_client, run, flow, tenant=None):
+    """
+    Records the token usage, latency and tool calls of a finished run and charges its tokens to the tenant.
+
+    Metrics must never break a flow, so errors while charging the budget or listing run steps are logged
+    and skipped.
+
+    :param project_client: The AIProjectClient that ran the run, used to list its steps.
+    :param run: The finished ``ThreadRun``.
+    :param flow: Name of the flow that started the run, such as ``02-file-search``.
+    :param tenant: Tenant to charge. Defaults to ``AGENT_TENANT``.
+    """
+    tenant = tenant or default_tenant()
+    registry = get_metrics()
+    labels = {"flow": flow, "tenant": tenant, "model": run.model or "unknown"}
+    registry.increment("agent_runs_total", dict(labels, status=_status(run.status)))
+
+    usage = run.usage
+    if usage:
+        registry.observe("agent_run_prompt_tokens", labels, usage.prompt_tokens)
+        registry.observe("agent_run_completion_tokens", labels, usage.completion_tokens)
+        try:
+            get_budget().charge(tenant, usage.total_tokens)
+        except Exception as e:
+            logger.warning("Could not charge run '%s' to tenant '%s': %s", run.id, tenant, e)
+        # The rate limiter only charged an estimate when the run started
+        throttling.get_rate_limiter().charge_tokens(usage.total_tokens - throttling.run_token_estimate())
+
+    if run.created_at and run.started_at:
+        registry.observe("agent_run_queue_seconds", labels, (run.started_at - run.created_at).total_seconds())
+    finished_at = run.completed_at or run.failed_at or run.cancelled_at
+    if run.started_at and finished_at:
+        registry.observe("agent_run_processing_seconds", labels, (finished_at - run.started_at).total_seconds())
+
+    try:
+        tool_calls = count_tool_calls(project_client, run.thread_id, run.id)
+    except Exception as e:
+        logger.warning("Could not list the steps of run '%s': %s", run.id, e)
+        return
+    registry.observe("agent_run_tool_calls", labels, sum(tool_calls.values()))
+    for tool_type, count in tool_calls.items():
+        registry.increment("agent_tool_calls_total", {"flow": flow, "tenant": tenant, "tool": tool_type}, count)
+
+
+def select_model(model, flow, tenant=None):
+    """
+    Applies the tenant's token budget to a new run and counts rejections and downgrades.
+
+    :raises budget.BudgetExceededError: If the tenant has used up its budget.
+    :return: The model deployment to create the agent with.
+    """
+    tenant = tenant or default_tenant()
+    registry = get_metrics()
+    try:
+        selected = get_budget().select_model(model, tenant)
+    except BudgetExceededError:
+        registry.increment("agent_budget_rejections_total", {"flow": flow, "tenant": tenant})
+        raise
+    if selected != model:
+        logger.warning("Tenant '%s' is near its token budget; using '%s' instead of '%s'.", tenant, selected, model)
+        registry.increment(
+            "agent_budget_downgrades_total",
+            {"flow": flow, "tenant": tenant, "model": model, "downgraded_to": selected}
+        )
+    return selected
+
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics():
+    """
+    Returns the process-wide metrics registry.
+    """
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = MetricsRegistry()
+        return _metrics
+
+
+def snapshot():
+    return get_metrics().snapshot()
+
+
+def to_prometheus():
+    return get_metrics().to_prometheus()
+
+
+def export_metrics(path=None):
+    """
+    Writes the current metrics to ``path`` or ``AGENT_METRICS_PATH``, if either is set.
+
+    Paths ending in ``.json`` get a JSON snapshot; any other path gets Prometheus text, e.g. for the
+    node exporter's textfile collector. A ``{pid}`` placeholder in the path is replaced with the process
+    ID, so worker processes can each write their own file.
+    """
+    path = path or os.environ.get(METRICS_PATH_ENV)
+    if not path:
+        return
+    path = path.replace("{pid}", str(os.getpid()))
+    content = json.dumps(snapshot(), indent=2) if path.endswith(".json") else to_prometheus()
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    with open(temporary_path, "w", encoding="utf-8") as metrics_file:
+        metrics_file.write(content)
+    # Atomic replace, so scrapers never read a half-written file
+    os.replace(temporary_path, path)
@@ -0,0 +1,40 @@
+"""
+Shared construction of the Azure AI Project Client used by the lab scripts.
+"""
+from azure.ai.projects import AIProjectClient
+
+import recording
+import resource_ledger
+import throttling
+
+
+def create_project_client(conn_str, credential):
+    """
+    Creates an AIProjectClient whose requests go through the shared rate limiter and retry policy,
+    and whose created resources are recorded in the local resource ledger.
+
+    When ``AGENT_CASSETTE_MODE`` is set, HTTP traffic is recorded to or replayed from a cassette. A
+    replayed client authenticates with a placeholder token and bypasses the rate limiter and the ledger,
+    because neither its requests nor the resources it sees reach the service.
+
+    :param conn_str: The project connection string.
+    :param credential: The credential used to authenticate with the project.
+    :return: The configured AIProjectClient.
+    """
+    mode = recording.cassette_mode()
+    if mode == recording.MODE_REPLAY:
+        credential = recording.ReplayCredential()
+        # Replayed requests never reach the service, so they skip the rate limiter. The retry policy
+        # stays, because it decides which recorded responses are retried.
+        options = {"retry_policy": throttling.JitteredRetryPolicy()}
+    else:
+        options = throttling.client_policies()
+        options.update(resource_ledger.client_policies())
+    if mode:
+        options["transport"] = recording.create_transport(mode)
+
+    return AIProjectClient.from_connection_string(
+        credential=credential,
+        conn_str=conn_str,
+        **options
+    )
@@ -0,0 +1,387 @@
+"""
+HTTP-level record and replay for the ``AIProjectClient`` transport.
+
+With ``AGENT_CASSETTE_MODE=record``, ``RecordingTransport`` sends requests over the network as usual
+and writes every request and response, including run polling and ``list_run_steps`` payloads, to the
+cassette file named by ``AGENT_CASSETTE``. With ``AGENT_CASSETTE_MODE=replay``, ``ReplayTransport``
+answers the same requests from the cassette without any network access, so serialization, polling and
+message parsing can be profiled and regression tested on their own.
+
+Cassettes are gzip-compressed JSON Lines. The first line is a header; each further line is one
+interaction, with the request method and path, the response status, a few headers that affect the
+client, the body and the time the service took to answer. Authorization headers are never stored.
+Replay returns responses at once by default, and ``poll_interval`` drops the waits between status polls;
+set ``AGENT_REPLAY_TIMING=recorded`` to wait as long as the service did when the cassette was recorded.
+"""
+import atexit
+import base64
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from urllib.parse import parse_qsl, urlencode, urlparse
+
+from azure.core.credentials import AccessToken
+from azure.core.exceptions import HttpResponseError
+from azure.core.pipeline.transport import HttpTransport, RequestsTransport
+from azure.core.rest import HttpResponse
+from azure.core.utils import CaseInsensitiveDict
+
+logger = logging.getLogger(__name__)
+
+# === Environment Variables ===
+CASSETTE_ENV = "AGENT_CASSETTE"
+CASSETTE_MODE_ENV = "AGENT_CASSETTE_MODE"
+REPLAY_TIMING_ENV = "AGENT_REPLAY_TIMING"
+
+# === Modes ===
+MODE_RECORD = "record"
+MODE_REPLAY = "replay"
+TIMING_NONE = "none"
+TIMING_RECORDED = "recorded"
+
+# === Defaults ===
+DEFAULT_CASSETTE_PATH = "./cassettes/session.jsonl.gz"
+CASSETTE_VERSION = 1
+CHUNK_SIZE = 4096  # Bytes per chunk when a replayed body is streamed
+
+# Response headers the client acts on; everything else is left out of the cassette
+RECORDED_HEADERS = frozenset([
+    "content-type",
+    "content-disposition",
+    "location",
+    "operation-location",
+    "retry-after",
+    "retry-after-ms",
+    "x-ms-retry-after-ms",
+])
+
+
+class CassetteMismatchError(Exception):
+    """
+    Raised when a replayed client sends a request that the cassette has no response for.
+    """
+
+
+def request_key(method, url):
+    """
+    Returns the key that a request is matched on: its method, path and sorted query string.
+    """
+    parsed = urlparse(url)
+    query = urlencode(sorted(parse_qsl(parsed.query, keep_blank_values=True)))
+    return f"{method.upper()} {parsed.path}" + (f"?{query}" if query else "")
+
+
+def _encode_body(content):
+    try:
+        return {"body": content.decode("utf-8")}
+    except UnicodeDecodeError:
+        return {"body_base64": base64.b64encode(content).decode("ascii")}
+
+
+def _decode_body(interaction):
+    if "body_base64" in interaction:
+        return base64.b64decode(interaction["body_base64"])
+    return interaction.get("body", "").encode("utf-8")
+
+
+class RecordingTransport(HttpTransport):
+    """
+    Sends requests through ``inner`` and records each exchange to a cassette.
+
+    The cassette is written when the transport is closed and again when the process exits, so scripts
+    that never close their client are recorded too.
+
+    :param path: Path of the cassette to write.
+    :param inner: The transport that actually sends requests. Defaults to ``RequestsTransport``.
+    """
+
+    def __init__(self, path, inner=None):
+        self.path = path
+        self._inner = inner or RequestsTransport()
+        self._lock = threading.Lock()
+        self._interactions = []
+        atexit.register(self.save)
+
+    def send(self, request, **kwargs):
+        started = time.monotonic()
+        response = self._inner.send(request, **kwargs)
+        # Buffer streamed downloads so they can be recorded; the caller still iterates over them
+        content = response.read()
+        elapsed = time.monotonic() - started
+
+        interaction = {
+            "request": request_key(request.method, request.url),
+            "status": response.status_code,
+            "reason": response.reason,
+            "headers": {
+                name.lower(): value for name, value in response.headers.items()
+                if name.lower() in RECORDED_HEADERS
+            },
+            "elapsed": round(elapsed, 4),
+            **_encode_body(content),
+        }
+        with self._lock:
+            self._interactions.append(interaction)
+        return response
+
+    def save(self):
+        """
+        Writes every interaction recorded so far to the cassette.
+        """
+        with self._lock:
+            interactions = list(self._interactions)
+        if not interactions:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary_path = f"{self.path}.{os.getpid()}.tmp"
+        with gzip.open(temporary_path, "wt", encoding="utf-8") as cassette:
+            header = {"version": CASSETTE_VERSION, "recorded_at": time.time(), "interactions": len(interactions)}
+            cassette.write(json.dumps(header) + "\n")
+            for interaction in interactions:
+                cassette.write(json.dumps(interaction, separators=(",", ":")) + "\n")
+        # Atomic replace, so an interrupted save never leaves a truncated cassette
+        os.replace(temporary_path, self.path)
+
+    def sleep(self, duration):
+        self._inner.sleep(duration)
+
+    def open(self):
+        self._inner.open()
+
+    def close(self):
+        self._inner.close()
+        self.save()
+
+    def __enter__(self):
+        self._inner.__enter__()
+        return self
+
+    def __exit__(self, *args):
+        self._inner.__exit__(*args)
+        self.save()
+
+
+def load_cassette(path):
+    """
+    Reads a cassette into its header and the list of recorded interactions.
+    """
+    with gzip.open(path, "rt", encoding="utf-8") as cassette:
+        header = json.loads(cassette.readline())
+        if header.get("version") != CASSETTE_VERSION:
+            raise ValueError(f"Unsupported cassette version {header.get('version')} in '{path}'.")
+        interactions = [json.loads(line) for line in cassette if line.strip()]
+    return header, interactions
+
+
+class RecordedResponse(HttpResponse):
+    """
+    A fully buffered response served from a cassette.
+
+    :param request: The request being answered.
+    :param status_code: The recorded status code.
+    :param reason: The recorded reason phrase.
+    :param headers: The recorded headers; lookups ignore case, as they do for live responses.
+    :param content: The recorded body.
+    """
+
+    def __init__(self, request, status_code, reason, headers, content):
+        self._request = request
+        self._status_code = status_code
+        self._reason = reason
+        self._headers = CaseInsensitiveDict(headers)
+        self._content = content
+        self._encoding = None
+        self._is_closed = False
+        self._is_stream_consumed = False
+
+    @property
+    def request(self):
+        return self._request
+
+    @property
+    def status_code(self):
+        return self._status_code
+
+    @property
+    def headers(self):
+        return self._headers
+
+    @property
+    def reason(self):
+        return self._reason
+
+    @property
+    def content_type(self):
+        return self._headers.get("content-type")
+
+    @property
+    def url(self):
+        return self._request.url
+
+    @property
+    def is_closed(self):
+        return self._is_closed
+
+    @property
+    def is_stream_consumed(self):
+        return self._is_stream_consumed
+
+    @property
+    def encoding(self):
+        return self._encoding
+
+    @encoding.setter
+    def encoding(self, value):
+        self._encoding = value
+
+    @property
+    def content(self):
+        return self._content
+
+    def text(self, encoding=None):
+        return self._content.decode(encoding or self._encoding or "utf-8-sig")
+
+    def json(self):
+        return json.loads(self.text())
+
+    def raise_for_status(self):
+        if self._status_code >= 400:
+            raise HttpResponseError(response=self)
+
+    def read(self):
+        self._is_stream_consumed = True
+        return self._content
+
+    def iter_bytes(self, **kwargs):
+        for start in range(0, len(self._content), CHUNK_SIZE):
+            yield self._content[start:start + CHUNK_SIZE]
+        self._is_stream_consumed = True
+        self.close()
+
+    def iter_raw(self, **kwargs):
+        return self.iter_bytes(**kwargs)
+
+    def close(self):
+        self._is_closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class ReplayTransport(HttpTransport):
+    """
+    Answers requests from a recorded cassette instead of the network.
+
+    Requests are matched on method, path and query. Repeated requests, such as run polling, receive
+    their recorded responses in order, so a replayed run goes through the same statuses as the recorded one.
+
+    :param path: Path of the cassette to replay.
+    :param timing: ``none`` to answer at once, or ``recorded`` to wait as long as the service did.
+    """
+
+    def __init__(self, path, timing=TIMING_NONE):
+        if timing not in (TIMING_NONE, TIMING_RECORDED):
+            raise ValueError(f"Unknown replay timing '{timing}'.")
+        self.path = path
+        self.timing = timing
+        self._lock = threading.Lock()
+        self._responses = defaultdict(deque)
+        _, interactions = load_cassette(path)
+        for interaction in interactions:
+            self._responses[interaction["request"]].append(interaction)
+
+    @property
+    def remaining(self):
+        """
+        The number of recorded interactions that have not been replayed yet.
+        """
+        with self._lock:
+            return sum(len(responses) for responses in self._responses.values())
+
+    def send(self, request, **kwargs):
+        key = request_key(request.method, request.url)
+        with self._lock:
+            responses = self._responses.get(key)
+            if not responses:
+                raise CassetteMismatchError(f"No recorded response left for '{key}' in '{self.path}'.")
+            interaction = responses.popleft()
+
+        if self.timing == TIMING_RECORDED:
+            time.sleep(interaction["elapsed"])
+
+        return RecordedResponse(
+            request=request,
+            status_code=interaction["status"],
+            reason=interaction["reason"],
+            headers=interaction["headers"],
+            content=_decode_body(interaction)
+        )
+
+    def sleep(self, duration):
+        # Retry waits only mean something against the live service
+        if self.timing == TIMING_RECORDED:
+            time.sleep(duration)
+
+    def open(self):
+        pass
+
+    def close(self):
+        remaining = self.remaining
+        if remaining:
+            logger.warning("%d recorded interaction(s) in '%s' were not replayed.", remaining, self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class ReplayCredential:
+    """
+    Credential used during replay, so no token has to be fetched from the network.
+    """
+
+    def get_token(self, *scopes, **kwargs):
+        return AccessToken("replay", int(time.time()) + 3600)
+
+
+def cassette_mode():
+    """
+    Returns ``record``, ``replay`` or None, from ``AGENT_CASSETTE_MODE``.
+    """
+    mode = os.environ.get(CASSETTE_MODE_ENV, "").strip().lower() or None
+    if mode not in (None, MODE_RECORD, MODE_REPLAY):
+        raise ValueError(f"Environment variable '{CASSETTE_MODE_ENV}' must be '{MODE_RECORD}' or '{MODE_REPLAY}'.")
+    return mode
+
+
+def poll_interval(default=1):
+    """
+    Returns the seconds to wait between status polls: 0 when replaying without recorded timing, else ``default``.
+
+    Pass it as ``sleep_interval`` to the SDK's polling helpers, such as ``create_and_process_run``, so a
+    replayed script is not dominated by the waits between its polls.
+    """
+    if cassette_mode() == MODE_REPLAY and os.environ.get(REPLAY_TIMING_ENV, TIMING_NONE) == TIMING_NONE:
+        return 0
+    return default
+
+
+def create_transport(mode):
+    """
+    Returns the recording or replaying transport for ``mode``, configured from the environment.
+    """
+    path = os.environ.get(CASSETTE_ENV, DEFAULT_CASSETTE_PATH)
+    if mode == MODE_RECORD:
+        return RecordingTransport(path)
+    return ReplayTransport(path, timing=os.environ.get(REPLAY_TIMING_ENV, TIMING_NONE))
@@ -0,0 +1,401 @@
+"""
+Local SQLite ledger of the agents, threads, files and vector stores created by the lab scripts.
+
+Every resource is recorded with its owner, tags and an expiry time. ``LedgerPolicy`` fills the ledger
+automatically from the responses of an ``AIProjectClient`` created through
+``project_client.create_project_client``, marks resources as released when they are deleted, and pushes
+back the expiry of threads and agents whenever a request uses them.
+``collect_expired`` and ``BackgroundCollector`` then delete only the resources whose TTL has passed.
+Batches are claimed with a lease, so several collectors and active workers can share one ledger safely.
+"""
+import json
+import logging
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+from urllib.parse import urlparse
+
+from azure.core.exceptions import ResourceNotFoundError
+from azure.core.pipeline.policies import SansIOHTTPPolicy
+
+logger = logging.getLogger(__name__)
+
+# === Environment Variables ===
+LEDGER_PATH_ENV = "AGENT_LEDGER_PATH"
+LEDGER_OWNER_ENV = "AGENT_LEDGER_OWNER"
+LEDGER_TTL_ENV = "AGENT_LEDGER_TTL"
+
+# === Defaults ===
+DEFAULT_LEDGER_PATH = "./.agent_ledger.sqlite3"
+DEFAULT_TTL = 3600  # Seconds a resource may live before the collector reclaims it
+DEFAULT_BATCH_SIZE = 20
+DEFAULT_CLAIM_SECONDS = 300  # How long a collector holds a batch before others may retry it
+DEFAULT_COLLECT_INTERVAL = 60
+
+# === Resource Kinds ===
+KIND_AGENT = "agent"
+KIND_THREAD = "thread"
+KIND_FILE = "file"
+KIND_VECTOR_STORE = "vector_store"
+
+# REST collection names mapped to the resource kinds they hold
+_COLLECTIONS = {
+    "assistants": KIND_AGENT,
+    "threads": KIND_THREAD,
+    "files": KIND_FILE,
+    "vector_stores": KIND_VECTOR_STORE,
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS resources (
+    resource_id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    tags TEXT NOT NULL DEFAULT '{}',
+    created_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    released_at REAL,
+    claimed_by TEXT,
+    claimed_until REAL
+);
+CREATE INDEX IF NOT EXISTS idx_resources_expiry ON resources (released_at, expires_at);
+CREATE INDEX IF NOT EXISTS idx_resources_owner ON resources (owner, released_at);
+"""
+
+
+def default_owner():
+    """
+    Returns the owner recorded for resources created by this process.
+    """
+    return os.environ.get(LEDGER_OWNER_ENV) or f"{socket.gethostname()}:{os.getpid()}"
+
+
+class ResourceLedger:
+    """
+    Records created resources in a SQLite database shared by every worker on the machine.
+
+    :param path: Path to the SQLite database file.
+    :param owner: Owner recorded for resources created through this ledger.
+    :param ttl: Default time to live, in seconds, for recorded resources.
+    """
+
+    def __init__(self, path=DEFAULT_LEDGER_PATH, owner=None, ttl=DEFAULT_TTL):
+        self.path = path
+        self.owner = owner or default_owner()
+        self.ttl = ttl
+        with self._connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(_SCHEMA)
+
+    def _connect(self):
+        # A connection per operation keeps the ledger safe to use from collector and worker threads
+        connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        return _Transaction(connection)
+
+    def record(self, kind, resource_id, ttl=None, tags=None):
+        """
+        Records a newly created resource.
+
+        :param kind: One of the ``KIND_*`` constants.
+        :param resource_id: The ID returned by the service.
+        :param ttl: Seconds until the resource may be collected. Defaults to the ledger's TTL.
+        :param tags: Optional dictionary of tags stored with the resource.
+        """
+        now = time.time()
+        ttl = self.ttl if ttl is None else ttl
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO resources "
+                "(resource_id, kind, owner, tags, created_at, expires_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (resource_id, kind, self.owner, json.dumps(tags or {}), now, now + ttl)
+            )
+
+    def extend(self, resource_id, ttl=None):
+        """
+        Pushes back the expiry of a resource that is still in use.
+        """
+        ttl = self.ttl if ttl is None else ttl
+        with self._connect() as connection:
+            connection.execute(
+                "UPDATE resources SET expires_at = ? WHERE resource_id = ? AND released_at IS NULL",
+                (time.time() + ttl, resource_id)
+            )
+
+    def released(self, resource_id):
+        """
+        Marks a resource as deleted so the collector no longer considers it.
+        """
+        with self._connect() as connection:
+            connection.execute(
+                "UPDATE resources SET released_at = ?, claimed_by = NULL, claimed_until = NULL "
+                "WHERE resource_id = ? AND released_at IS NULL",
+                (time.time(), resource_id)
+            )
+
+    def expired(self, limit=None):
+        """
+        Lists live resources whose TTL has passed, oldest first, without claiming them.
+        """
+        query = (
+            "SELECT * FROM resources WHERE released_at IS NULL AND expires_at <= ? "
+            "ORDER BY expires_at"
+        )
+        params = [time.time()]
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        with self._connect() as connection:
+            return [dict(row) for row in connection.execute(query, params)]
+
+    def live(self, owner=None):
+        """
+        Lists resources that have not been released, optionally only those of one owner.
+        """
+        query = "SELECT * FROM resources WHERE released_at IS NULL"
+        params = []
+        if owner is not None:
+            query += " AND owner = ?"
+            params.append(owner)
+        with self._connect() as connection:
+            return [dict(row) for row in connection.execute(query + " ORDER BY created_at", params)]
+
+    def claim_expired(self, limit=DEFAULT_BATCH_SIZE, claim_seconds=DEFAULT_CLAIM_SECONDS, collector=None):
+        """
+        Atomically claims a batch of expired resources for deletion.
+
+        Resources already claimed by another collector are skipped until that claim lapses.
+
+        :return: The claimed resources as dictionaries.
+        """
+        collector = collector or self.owner
+        now = time.time()
+        with self._connect() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            rows = [dict(row) for row in connection.execute(
+                "SELECT * FROM resources WHERE released_at IS NULL AND expires_at <= ? "
+                "AND (claimed_until IS NULL OR claimed_until <= ?) ORDER BY expires_at LIMIT ?",
+                (now, now, limit)
+            )]
+            connection.executemany(
+                "UPDATE resources SET claimed_by = ?, claimed_until = ? WHERE resource_id = ?",
+                [(collector, now + claim_seconds, row["resource_id"]) for row in rows]
+            )
+        return rows
+
+
+class _Transaction:
+    """
+    Context manager that commits or rolls back an autocommit connection and always closes it.
+    """
+
+    def __init__(self, connection):
+        self._connection = connection
+
+    def __enter__(self):
+        return self._connection
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            if self._connection.in_transaction:
+                self._connection.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            self._connection.close()
+        return False
+
+
+def delete_resource(project_client, kind, resource_id):
+    """
+    Deletes a single resource. A resource that no longer exists counts as deleted.
+    """
+    deleters = {
+        KIND_AGENT: "delete_agent",
+        KIND_THREAD: "delete_thread",
+        KIND_FILE: "delete_file",
+        KIND_VECTOR_STORE: "delete_vector_store",
+    }
+    try:
+        getattr(project_client.agents, deleters[kind])(resource_id)
+    except ResourceNotFoundError:
+        pass
+
+
+def collect_expired(project_client, ledger, batch_size=DEFAULT_BATCH_SIZE, max_batches=None):
+    """
+    Deletes expired resources in batches until none are left.
+
+    :param project_client: Client used to delete the resources.
+    :param ledger: The ledger to collect from.
+    :param batch_size: Number of resources claimed per batch.
+    :param max_batches: Optional cap on the number of batches processed.
+    :return: The number of resources deleted.
+    """
+    deleted = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        batch = ledger.claim_expired(limit=batch_size)
+        if not batch:
+            break
+        batches += 1
+        for resource in batch:
+            try:
+                delete_resource(project_client, resource["kind"], resource["resource_id"])
+            except Exception as e:
+                # Leave the claim in place; the resource is retried once it lapses
+                logger.warning("Failed to delete %s %s: %s", resource["kind"], resource["resource_id"], e)
+                continue
+            ledger.released(resource["resource_id"])
+            deleted += 1
+    return deleted
+
+
+class BackgroundCollector(threading.Thread):
+    """
+    Daemon thread that periodically deletes expired resources from the ledger.
+
+    :param project_client: Client used to delete the resources.
+    :param ledger: The ledger to collect from.
+    :param interval: Seconds to wait between collection passes.
+    :param batch_size: Number of resources claimed per batch.
+    """
+
+    def __init__(self, project_client, ledger, interval=DEFAULT_COLLECT_INTERVAL, batch_size=DEFAULT_BATCH_SIZE):
+        super().__init__(name="resource-ledger-collector", daemon=True)
+        self._project_client = project_client
+        self._ledger = ledger
+        self._interval = interval
+        self._batch_size = batch_size
+        self._stop_event = threading.Event()
+        self.deleted = 0
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.deleted += collect_expired(self._project_client, self._ledger, self._batch_size)
+            except Exception as e:
+                logger.warning("Resource collection pass failed: %s", e)
+            self._stop_event.wait(self._interval)
+
+    def stop(self, timeout=None):
+        """
+        Asks the collector to finish its current pass and waits for it to exit.
+        """
+        self._stop_event.set()
+        self.join(timeout)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+        return False
+
+
+def _resource_path(url):
+    """
+    Splits a request URL into (collection, resource ID) for top-level agent resources.
+
+    Nested paths such as ``/vector_stores/{id}/files`` are not top-level resources and return (None, None).
+    ``/threads/runs`` creates a thread along with its first run, so it counts as the thread collection.
+    """
+    segments = [segment for segment in urlparse(url).path.split("/") if segment]
+    if segments[-2:] == ["threads", "runs"]:
+        return "threads", None
+    if segments and segments[-1] in _COLLECTIONS:
+        if len(segments) < 3 or segments[-3] not in _COLLECTIONS:
+            return segments[-1], None
+    elif len(segments) >= 2 and segments[-2] in _COLLECTIONS:
+        if len(segments) < 4 or segments[-4] not in _COLLECTIONS:
+            return segments[-2], segments[-1]
+    return None, None
+
+
+def _used_resources(url, http_response):
+    """
+    Returns the IDs of the threads and agents a successful request works with.
+
+    Threads and agents are named in the path, e.g. ``/threads/{id}/runs``. Runs also name the agent
+    they run in their body, so polling a run keeps its agent alive as well as its thread.
+    """
+    segments = [segment for segment in urlparse(url).path.split("/") if segment]
+    used = [
+        segments[index + 1] for index, segment in enumerate(segments[:-1])
+        if segment in ("threads", "assistants") and segments[index + 1] != "runs"
+    ]
+    if "runs" in segments:
+        assistant_id = http_response.json().get("assistant_id")
+        if assistant_id:
+            used.append(assistant_id)
+    return used
+
+
+class LedgerPolicy(SansIOHTTPPolicy):
+    """
+    Pipeline policy that records created resources in the ledger and releases deleted ones.
+
+    Threads and agents also have their expiry pushed back whenever a request uses them, so the
+    collector leaves long conversations and runs alone.
+
+    :param ledger: The ledger to record resources in.
+    :param tags: Tags stored with every resource this policy records.
+    """
+
+    def __init__(self, ledger, tags=None):
+        super().__init__()
+        self._ledger = ledger
+        self._tags = tags or {}
+
+    def on_response(self, request, response):
+        http_request = request.http_request
+        http_response = response.http_response
+        collection, resource_id = _resource_path(http_request.url)
+        method = http_request.method.upper()
+        status = http_response.status_code
+        try:
+            if method == "DELETE":
+                if resource_id is not None and (200 <= status < 300 or status == 404):
+                    self._ledger.released(resource_id)
+            elif not 200 <= status < 300:
+                return
+            elif method == "POST" and collection is not None and resource_id is None:
+                body = http_response.json()
+                # create_thread_and_run answers with the run; the new thread is its thread_id
+                created_id = body.get("thread_id") if body.get("object") == "thread.run" else body.get("id")
+                if created_id:
+                    self._ledger.record(_COLLECTIONS[collection], created_id, tags=self._tags)
+            else:
+                for used_id in _used_resources(http_request.url, http_response):
+                    self._ledger.extend(used_id)
+        except Exception as e:
+            # The ledger must never break the call it is observing
+            logger.warning("Failed to update resource ledger for %s %s: %s", method, http_request.url, e)
+
+
+_ledger = None
+_ledger_lock = threading.Lock()
+
+
+def get_ledger():
+    """
+    Returns the process-wide resource ledger, creating it from the environment on first use.
+    """
+    global _ledger
+    with _ledger_lock:
+        if _ledger is None:
+            _ledger = ResourceLedger(
+                path=os.environ.get(LEDGER_PATH_ENV, DEFAULT_LEDGER_PATH),
+                ttl=int(os.environ.get(LEDGER_TTL_ENV, DEFAULT_TTL))
+            )
+        return _ledger
+
+
+def client_policies():
+    """
+    Returns the keyword arguments that install resource tracking on an ``AIProjectClient``.
+    """
+    script = os.path.basename(sys.argv[0]) if sys.argv and sys.argv[0] else "interactive"
+    return {"per_call_policies": [LedgerPolicy(get_ledger(), tags={"script": script})]}
@@ -0,0 +1,344 @@
+"""
+Client-side rate limiting and retry scheduling for Azure AI Agent Service calls.
+
+Every HTTP request sent by an ``AIProjectClient`` created through ``project_client.create_project_client``
+passes through a single, process-wide ``RateLimiter``. The limiter keeps one token bucket for
+requests per minute and one for tokens per minute, serves waiting requests round-robin across
+conversations (threads) so one busy conversation cannot starve the others, and pauses all traffic
+when the service answers with ``429 Too Many Requests``. ``JitteredRetryPolicy`` then retries the
+throttled request, honouring the ``Retry-After`` header and never replaying non-idempotent calls
+that the service may already have processed. Runs are charged an estimate when they start;
+``metrics.record_run`` charges the rest of their actual usage once they finish.
+"""
+import email.utils
+import os
+import random
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+
+from azure.core.pipeline.policies import HTTPPolicy, RetryPolicy
+
+# === Environment Variables ===
+RPM_LIMIT_ENV = "AGENT_RPM_LIMIT"
+TPM_LIMIT_ENV = "AGENT_TPM_LIMIT"
+RUN_TOKEN_ESTIMATE_ENV = "AGENT_RUN_TOKEN_ESTIMATE"
+
+# === Defaults ===
+DEFAULT_RPM_LIMIT = 300
+DEFAULT_TPM_LIMIT = 100000
+DEFAULT_RUN_TOKEN_ESTIMATE = 1000  # Tokens charged up front for every run that is started
+DEFAULT_THROTTLE_PAUSE = 1.0  # Seconds to pause when a 429 carries no Retry-After header
+CHARS_PER_TOKEN = 4
+
+IDEMPOTENT_METHODS = frozenset(["GET", "HEAD", "PUT", "DELETE", "OPTIONS", "TRACE"])
+DEFAULT_CONVERSATION = "default"
+_THREAD_ID_PATTERN = re.compile(r"/threads/([^/?]+)")
+_RUNS_PATTERN = re.compile(r"/runs/?(\?|$)")
+
+
+class TokenBucket:
+    """
+    A thread-safe token bucket that refills continuously up to its capacity.
+
+    :param capacity: Maximum number of tokens the bucket can hold.
+    :param refill_per_second: Number of tokens added to the bucket every second.
+    """
+
+    def __init__(self, capacity, refill_per_second):
+        self.capacity = float(capacity)
+        self.refill_per_second = float(refill_per_second)
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self._updated
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.refill_per_second)
+        self._updated = now
+
+    def delay(self, amount):
+        """
+        Returns the number of seconds until ``amount`` tokens are available.
+
+        Requests larger than the bucket are capped at its capacity so they can still be admitted.
+        """
+        amount = min(float(amount), self.capacity)
+        with self._lock:
+            self._refill(time.monotonic())
+            missing = amount - self._tokens
+        if missing <= 0:
+            return 0.0
+        return missing / self.refill_per_second
+
+    def take(self, amount):
+        """
+        Removes ``amount`` tokens from the bucket. The balance may go negative, which delays later callers.
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens -= min(float(amount), self.capacity)
+
+    def available(self):
+        with self._lock:
+            self._refill(time.monotonic())
+            return self._tokens
+
+
+class FairQueue:
+    """
+    Admits callers one at a time, round-robin across conversation keys and FIFO within a key.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._queues = OrderedDict()  # Conversation key -> deque of waiting tickets
+
+    def wait_turn(self, key):
+        """
+        Blocks until the caller is at the head of its conversation and that conversation is next in turn.
+
+        :return: A ticket that must be passed to ``done``.
+        """
+        ticket = object()
+        with self._condition:
+            self._queues.setdefault(key, deque()).append(ticket)
+            while next(iter(self._queues)) != key or self._queues[key][0] is not ticket:
+                self._condition.wait()
+        return ticket
+
+    def done(self, key, ticket):
+        """
+        Releases the caller's turn and moves its conversation to the back of the rotation.
+        """
+        with self._condition:
+            queue = self._queues.pop(key)
+            queue.remove(ticket)
+            if queue:
+                self._queues[key] = queue
+            self._condition.notify_all()
+
+    def depth(self):
+        with self._condition:
+            return {key: len(queue) for key, queue in self._queues.items()}
+
+
+class RateLimiter:
+    """
+    Shared limiter enforcing requests-per-minute and tokens-per-minute budgets.
+
+    :param rpm_limit: Maximum number of requests admitted per minute.
+    :param tpm_limit: Maximum number of (estimated) model tokens admitted per minute.
+    """
+
+    def __init__(self, rpm_limit=DEFAULT_RPM_LIMIT, tpm_limit=DEFAULT_TPM_LIMIT):
+        self.requests = TokenBucket(rpm_limit, rpm_limit / 60.0)
+        self.tokens = TokenBucket(tpm_limit, tpm_limit / 60.0)
+        self._queue = FairQueue()
+        self._lock = threading.Lock()
+        self._paused_until = 0.0
+        self._counters = {
+            "requests_admitted": 0,
+            "tokens_admitted": 0,
+            "throttle_events": 0,
+            "wait_seconds_total": 0.0,
+        }
+
+    def acquire(self, conversation=DEFAULT_CONVERSATION, tokens=0):
+        """
+        Blocks until the request may be sent, then charges it against both buckets.
+
+        :param conversation: Key used for fair queuing, usually the thread ID.
+        :param tokens: Estimated number of model tokens the request will consume.
+        :return: Seconds spent waiting.
+        """
+        started = time.monotonic()
+        ticket = self._queue.wait_turn(conversation)
+        try:
+            while True:
+                with self._lock:
+                    paused = self._paused_until - time.monotonic()
+                delay = max(paused, self.requests.delay(1), self.tokens.delay(tokens))
+                if delay <= 0:
+                    break
+                time.sleep(delay)
+            self.requests.take(1)
+            self.tokens.take(tokens)
+        finally:
+            self._queue.done(conversation, ticket)
+
+        waited = time.monotonic() - started
+        with self._lock:
+            self._counters["requests_admitted"] += 1
+            self._counters["tokens_admitted"] += tokens
+            self._counters["wait_seconds_total"] += waited
+        return waited
+
+    def charge_tokens(self, tokens):
+        """
+        Charges tokens that were consumed beyond the estimate made when the request was admitted.
+        """
+        if tokens > 0:
+            self.tokens.take(tokens)
+            with self._lock:
+                self._counters["tokens_admitted"] += tokens
+
+    def throttled(self, retry_after=None):
+        """
+        Records a throttle event and pauses all conversations until the service is ready again.
+
+        :param retry_after: Seconds the service asked us to wait, if it said.
+        """
+        pause = DEFAULT_THROTTLE_PAUSE if retry_after is None else retry_after
+        with self._lock:
+            self._counters["throttle_events"] += 1
+            self._paused_until = max(self._paused_until, time.monotonic() + pause)
+
+    def metrics(self):
+        """
+        Returns a snapshot of the limiter's queue depth, bucket levels and counters.
+        """
+        depth = self._queue.depth()
+        with self._lock:
+            snapshot = dict(self._counters)
+            snapshot["paused_seconds_remaining"] = max(0.0, self._paused_until - time.monotonic())
+        snapshot["queue_depth"] = sum(depth.values())
+        snapshot["queue_depth_by_conversation"] = depth
+        snapshot["requests_available"] = self.requests.available()
+        snapshot["tokens_available"] = self.tokens.available()
+        return snapshot
+
+
+def parse_retry_after(headers):
+    """
+    Reads the delay requested by the service from ``retry-after-ms``, ``x-ms-retry-after-ms`` or ``Retry-After``.
+
+    :return: The delay in seconds, or None if no usable header is present.
+    """
+    for header in ("retry-after-ms", "x-ms-retry-after-ms"):
+        value = headers.get(header)
+        if value:
+            try:
+                return max(0.0, float(value) / 1000.0)
+            except ValueError:
+                pass
+
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+def conversation_key(url):
+    """
+    Returns the thread ID a request belongs to, or the default key for agent, file and vector store calls.
+    """
+    match = _THREAD_ID_PATTERN.search(url)
+    return match.group(1) if match else DEFAULT_CONVERSATION
+
+
+def estimate_tokens(http_request, run_token_estimate=DEFAULT_RUN_TOKEN_ESTIMATE):
+    """
+    Estimates the model tokens a request will consume.
+
+    Starting a run is charged a fixed estimate; other requests are charged by the size of their body.
+    """
+    tokens = 0
+    if http_request.method.upper() == "POST" and _RUNS_PATTERN.search(http_request.url):
+        tokens += run_token_estimate
+    body = getattr(http_request, "content", None)
+    if isinstance(body, (bytes, str)):
+        tokens += len(body) // CHARS_PER_TOKEN
+    return tokens
+
+
+class ThrottlingPolicy(HTTPPolicy):
+    """
+    Pipeline policy that admits every request attempt through a ``RateLimiter``.
+
+    It runs once per retry attempt, so retried requests are charged again and a 429 response pauses
+    all traffic before ``JitteredRetryPolicy`` schedules the retry.
+    """
+
+    def __init__(self, limiter, run_token_estimate=DEFAULT_RUN_TOKEN_ESTIMATE):
+        super().__init__()
+        self._limiter = limiter
+        self._run_token_estimate = run_token_estimate
+
+    def send(self, request):
+        http_request = request.http_request
+        self._limiter.acquire(
+            conversation=conversation_key(http_request.url),
+            tokens=estimate_tokens(http_request, self._run_token_estimate)
+        )
+        response = self.next.send(request)
+        if response.http_response.status_code == 429:
+            self._limiter.throttled(parse_retry_after(response.http_response.headers))
+        return response
+
+
+class JitteredRetryPolicy(RetryPolicy):
+    """
+    Retry policy with full-jitter exponential backoff that only replays safe requests.
+
+    Idempotent methods are retried on any retryable status. Other methods, such as creating a run,
+    are only retried after a 429, because the service rejected those before doing any work.
+    ``Retry-After`` headers take precedence over the computed backoff.
+    """
+
+    def is_retry(self, settings, response):
+        # The base policy only retries a POST on 429 when Retry-After is present, so decide 429s here
+        if response.http_response.status_code == 429:
+            return bool(settings["total"])
+        if response.http_request.method.upper() not in IDEMPOTENT_METHODS:
+            return False
+        return super().is_retry(settings, response)
+
+    def get_backoff_time(self, settings):
+        return random.uniform(0, super().get_backoff_time(settings))
+
+
+_rate_limiter = None
+_rate_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    """
+    Returns the process-wide rate limiter, creating it from the environment on first use.
+    """
+    global _rate_limiter
+    with _rate_limiter_lock:
+        if _rate_limiter is None:
+            _rate_limiter = RateLimiter(
+                rpm_limit=int(os.environ.get(RPM_LIMIT_ENV, DEFAULT_RPM_LIMIT)),
+                tpm_limit=int(os.environ.get(TPM_LIMIT_ENV, DEFAULT_TPM_LIMIT))
+            )
+        return _rate_limiter
+
+
+def run_token_estimate():
+    """
+    Returns the tokens charged up front for every run that is started, from ``AGENT_RUN_TOKEN_ESTIMATE``.
+    """
+    return int(os.environ.get(RUN_TOKEN_ESTIMATE_ENV, DEFAULT_RUN_TOKEN_ESTIMATE))
+
+
+def client_policies():
+    """
+    Returns the keyword arguments that install throttling and retry handling on an ``AIProjectClient``.
+    """
+    return {
+        "retry_policy": JitteredRetryPolicy(),
+        "per_retry_policies": [
+            ThrottlingPolicy(get_rate_limiter(), run_token_estimate=run_token_estimate())
+        ],
+    }
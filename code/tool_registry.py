@@ -0,0 +1,280 @@
+"""
+Registry of function tools whose JSON schemas are compiled once and cached on disk.
+
+``FunctionTool`` imports every function and introspects its signature and docstring each time a
+process starts. ``ToolRegistry`` instead reads the module's source with ``ast``, compiles the same
+schemas that ``FunctionTool`` would produce, and stores them in a JSON artifact keyed by a hash of
+the source. Later start-ups only hash the source and load the artifact. A module is imported only
+when the agent first calls one of its functions during a ``requires_action`` step.
+"""
+import ast
+import hashlib
+import importlib
+import importlib.util
+import json
+import logging
+import os
+
+from azure.ai.projects.models import (
+    FunctionDefinition,
+    FunctionToolDefinition,
+    RequiredFunctionToolCall,
+    ToolOutput
+)
+
+logger = logging.getLogger(__name__)
+
+# Bump when the compiled schema format changes, so existing artifacts are rebuilt
+COMPILER_VERSION = "1"
+CACHE_DIR_NAME = ".tool_cache"
+
+# Same mapping FunctionTool uses for annotation names
+_TYPE_MAP = {
+    "str": "string",
+    "int": "integer",
+    "float": "number",
+    "bool": "boolean",
+    "NoneType": "null",
+    "None": "null",
+    "list": "array",
+    "dict": "object",
+    "Dict": "object",
+}
+
+
+def _annotation_name(node):
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        return node.attr
+    if isinstance(node, ast.Constant) and node.value is None:
+        return "None"
+    return None
+
+
+def _map_annotation(node):
+    """
+    Maps an annotation AST node to a JSON schema fragment, following ``FunctionTool``'s rules.
+
+    Like ``FunctionTool``, ``X | None`` unions are not recognised and map to a required string.
+    """
+    if node is None:
+        return {"type": "string"}
+
+    if isinstance(node, ast.Subscript):
+        origin = _annotation_name(node.value)
+        args = _subscript_args(node)
+        if origin in ("list", "List"):
+            return {"type": "array", "items": _map_annotation(args[0])}
+        if origin in ("dict", "Dict"):
+            return {"type": "object"}
+        if origin == "Optional":
+            return _map_union([args[0], ast.Constant(value=None)])
+        if origin == "Union":
+            return _map_union(args)
+        return {"type": "string"}
+
+    name = _annotation_name(node)
+    if name == "List":
+        return {"type": "array", "items": {"type": "string"}}
+    return {"type": _TYPE_MAP.get(name, "string")}
+
+
+def _subscript_args(node):
+    # Python 3.8 wraps subscripts in ast.Index
+    index = node.slice.value if isinstance(node.slice, getattr(ast, "Index", ())) else node.slice
+    return index.elts if isinstance(index, ast.Tuple) else [index]
+
+
+def _map_union(args):
+    non_none = [arg for arg in args if _annotation_name(arg) not in ("None", "NoneType")]
+    if len(non_none) == 1 and len(non_none) < len(args):
+        schema = _map_annotation(non_none[0])
+        schema["type"] = [schema["type"], "null"] if isinstance(schema["type"], str) else schema["type"] + ["null"]
+        return schema
+    return {"oneOf": [_map_annotation(arg) for arg in args]}
+
+
+def _is_optional(node):
+    if isinstance(node, ast.Subscript):
+        origin = _annotation_name(node.value)
+        args = _subscript_args(node)
+        return origin == "Optional" or (
+            origin == "Union" and any(_annotation_name(arg) in ("None", "NoneType") for arg in args)
+        )
+    return False
+
+
+def _param_descriptions(docstring):
+    descriptions = {}
+    for line in docstring.splitlines():
+        line = line.strip()
+        if not line.startswith(":param"):
+            continue
+        head, _, description = line[len(":param"):].partition(":")
+        name = head.split("(")[0].strip()
+        if name:
+            descriptions[name] = description.strip() or "No description"
+    return descriptions
+
+
+def compile_source(source):
+    """
+    Compiles the public top-level functions in ``source`` to function tool definitions.
+
+    :param source: Python source code of a module.
+    :return: A list of ``{"name", "description", "parameters"}`` dictionaries.
+    """
+    definitions = []
+    for node in ast.parse(source).body:
+        if not isinstance(node, ast.FunctionDef) or node.name.startswith("_"):
+            continue
+        docstring = ast.get_docstring(node) or ""
+        descriptions = _param_descriptions(docstring)
+        arguments = node.args.posonlyargs + node.args.args + node.args.kwonlyargs
+        defaults = [None] * (len(node.args.posonlyargs + node.args.args) - len(node.args.defaults))
+        defaults += node.args.defaults + node.args.kw_defaults
+
+        properties = {}
+        required = []
+        for argument, default in zip(arguments, defaults):
+            properties[argument.arg] = {
+                **_map_annotation(argument.annotation),
+                "description": descriptions.get(argument.arg, "No description"),
+            }
+            if default is None and not _is_optional(argument.annotation):
+                required.append(argument.arg)
+
+        definitions.append({
+            "name": node.name,
+            "description": docstring.split("\n", maxsplit=1)[0] if docstring else "No description",
+            "parameters": {"type": "object", "properties": properties, "required": required},
+        })
+    return definitions
+
+
+class ToolRegistry:
+    """
+    Function tools loaded from cached schemas and resolved by name on first call.
+
+    :param cache_dir: Directory for compiled schema artifacts. Defaults to a ``.tool_cache``
+        directory next to each registered module.
+    """
+
+    def __init__(self, cache_dir=None):
+        self._cache_dir = cache_dir
+        self._modules = {}  # Function name -> module name
+        self._schemas = {}  # Function name -> compiled schema
+        self._functions = {}  # Function name -> callable, filled on first call
+        self._definitions = None
+
+    def register_module(self, module_name, names=None):
+        """
+        Registers the public functions of a module without importing it.
+
+        :param module_name: Importable name of the module that defines the functions.
+        :param names: Optional collection of function names to register; defaults to all of them.
+        """
+        spec = importlib.util.find_spec(module_name)
+        if spec is None or not spec.origin:
+            raise ModuleNotFoundError(f"Cannot find module '{module_name}'.")
+        with open(spec.origin, "rb") as source_file:
+            source = source_file.read()
+        source_hash = hashlib.sha256(COMPILER_VERSION.encode("utf-8") + source).hexdigest()
+
+        cache_dir = self._cache_dir or os.path.join(os.path.dirname(spec.origin), CACHE_DIR_NAME)
+        cache_path = os.path.join(cache_dir, f"{module_name}.json")
+        schemas = self._load_artifact(cache_path, source_hash)
+        if schemas is None:
+            schemas = compile_source(source)
+            self._write_artifact(cache_path, source_hash, schemas)
+
+        for schema in schemas:
+            name = schema["name"]
+            if names is not None and name not in names:
+                continue
+            if name in self._modules and self._modules[name] != module_name:
+                raise ValueError(f"Function '{name}' is registered by both '{self._modules[name]}' and '{module_name}'.")
+            self._modules[name] = module_name
+            self._schemas[name] = schema
+        self._definitions = None
+
+    @staticmethod
+    def _load_artifact(cache_path, source_hash):
+        try:
+            with open(cache_path, encoding="utf-8") as cache_file:
+                artifact = json.load(cache_file)
+        except (OSError, ValueError):
+            return None
+        if artifact.get("source_hash") != source_hash:
+            return None
+        return artifact["functions"]
+
+    @staticmethod
+    def _write_artifact(cache_path, source_hash, schemas):
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            temporary_path = f"{cache_path}.{os.getpid()}.tmp"
+            with open(temporary_path, "w", encoding="utf-8") as cache_file:
+                json.dump({"source_hash": source_hash, "functions": schemas}, cache_file)
+            # Atomic replace, so concurrent processes never read a half-written artifact
+            os.replace(temporary_path, cache_path)
+        except OSError as e:
+            logger.warning("Could not write tool schema cache '%s': %s", cache_path, e)
+
+    @property
+    def names(self):
+        return list(self._schemas)
+
+    @property
+    def definitions(self):
+        """
+        The function tool definitions to pass as ``tools`` when creating an agent.
+        """
+        if self._definitions is None:
+            self._definitions = [
+                FunctionToolDefinition(function=FunctionDefinition(**schema))
+                for schema in self._schemas.values()
+            ]
+        return self._definitions
+
+    def get(self, name):
+        """
+        Returns the function registered under ``name``, importing its module on first use.
+        """
+        if name not in self._functions:
+            if name not in self._modules:
+                raise ValueError(f"Function '{name}' not found.")
+            module = importlib.import_module(self._modules[name])
+            self._functions[name] = getattr(module, name)
+        return self._functions[name]
+
+    def execute(self, tool_call):
+        """
+        Runs a single function tool call and returns its output as a string.
+
+        Bad arguments are reported back to the agent as a JSON error, as ``FunctionTool`` does.
+        """
+        function = self.get(tool_call.function.name)
+        arguments = json.loads(tool_call.function.arguments or "{}")
+        if not isinstance(arguments, dict):
+            raise TypeError("Arguments must be a JSON object.")
+        try:
+            output = function(**arguments)
+        except TypeError as e:
+            error_message = f"Error executing function '{tool_call.function.name}': {e}"
+            logger.error(error_message)
+            return json.dumps({"error": error_message})
+        return output if isinstance(output, str) else json.dumps(output)
+
+    def execute_tool_calls(self, tool_calls):
+        """
+        Runs the function calls of a ``requires_action`` step.
+
+        :return: The ``ToolOutput`` list to pass to ``submit_tool_outputs_to_run``.
+        """
+        return [
+            ToolOutput(tool_call_id=tool_call.id, output=self.execute(tool_call))
+            for tool_call in tool_calls
+            if isinstance(tool_call, RequiredFunctionToolCall)
+        ]
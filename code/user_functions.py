@@ -0,0 +1,29 @@
+import json
+import datetime
+
+
+def fetch_weather(location: str) -> str:
+    """
+    Fetches the weather information for the specified location.
+
+    :param location (str): The location to fetch weather for.
+    :return: Weather information as a JSON string.
+    :rtype: str
+    """
+    # In a real-world scenario, you'd integrate with a weather API.
+    # Here, we'll mock the response.
+    mock_weather_data = {"New York": "Sunny, 25°C", "London": "Cloudy, 18°C", "Tokyo": "Rainy, 22°C"}
+    weather = mock_weather_data.get(location, "Weather data not available for this location.")
+    weather_json = json.dumps({"weather": weather})
+    return weather_json
+
+
+def get_current_time() -> str:
+    """
+    Gets the current time in AM/PM format.
+
+    :return: The current time in AM/PM format.
+    :rtype: str
+    """
+    current_time = datetime.datetime.now().strftime("%I:%M:%S %p")
+    return current_time
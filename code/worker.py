@@ -0,0 +1,296 @@
+"""
+Runs agent jobs from the durable job queue on a fleet of worker processes.
+
+Examples (run from the repository root)::
+
+    python code/worker.py enqueue --prompt "Can you provide details about the AI-Powered Smart Hub?" \
+        --tool file_search --file ./documents/product_catalog.pdf
+    python code/worker.py enqueue --from-file jobs.jsonl
+    python code/worker.py run --workers 4
+    python code/worker.py stats
+
+Each worker process claims jobs with a lease, runs them through ``agent_flows.run_agent_job`` and
+writes the result back to the queue. The supervisor restarts workers that die, waiting longer after
+each crash in a row; jobs they held are picked up by another worker once the lease lapses. With
+``--exit-when-empty`` workers stop once no job is queued or running. The rate limits configured for ``throttling`` are
+shared out evenly between the worker processes. When ``AGENT_METRICS_PATH`` is set, each worker writes
+its run metrics after every job; include ``{pid}`` in the path so workers do not overwrite each other.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+
+from dotenv import load_dotenv
+from azure.identity import DefaultAzureCredential
+
+import throttling
+from agent_flows import JobSpecError, run_agent_job
+from budget import BudgetExceededError
+from job_queue import (
+    DEFAULT_JOB_QUEUE_PATH,
+    DEFAULT_LEASE_SECONDS,
+    DEFAULT_MAX_ATTEMPTS,
+    JOB_QUEUE_PATH_ENV,
+    JobQueue
+)
+from metrics import export_metrics
+from project_client import create_project_client
+
+# === Environment Variables ===
+PROJECT_CONNECTION_STRING_ENV = "PROJECT_CONNECTION_STRING"
+
+# === Operational Constants ===
+DEFAULT_WORKERS = 2
+POLL_INTERVAL = 2  # Seconds an idle worker waits before checking the queue again
+STATS_INTERVAL = 30  # Seconds between throughput reports from the supervisor
+RESTART_BACKOFF_BASE = 1  # Seconds before restarting a worker after its first crash
+RESTART_BACKOFF_MAX = 60  # Longest wait before restarting a crashing worker
+HEALTHY_RUN_SECONDS = 60  # A worker that ran this long before crashing is restarted without delay
+
+
+class LeaseKeeper(threading.Thread):
+    """
+    Heartbeats a claimed job until the work is done, so long runs keep their lease.
+    """
+
+    def __init__(self, queue, job, lease_seconds):
+        super().__init__(name=f"lease-{job['job_id']}", daemon=True)
+        self._queue = queue
+        self._job = job
+        self._lease_seconds = lease_seconds
+        self._done = threading.Event()
+        self.lost = False
+
+    def run(self):
+        while not self._done.wait(self._lease_seconds / 3):
+            if not self._queue.heartbeat(self._job["job_id"], self._job["worker_id"], self._lease_seconds):
+                self.lost = True
+                return
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._done.set()
+        self.join()
+        return False
+
+
+def process_job(queue, project_client, job, lease_seconds):
+    """
+    Runs a single claimed job and records its outcome in the queue.
+    """
+    job_id = job["job_id"]
+    worker_id = job["worker_id"]
+    print(f"[{worker_id}] Running job {job_id} (attempt {job['attempts']} of {job['max_attempts']})...")
+    with LeaseKeeper(queue, job, lease_seconds) as lease:
+        try:
+            result = run_agent_job(project_client, job["payload"])
+        except (JobSpecError, BudgetExceededError) as e:
+            queue.fail(job_id, worker_id, e, retry=False)
+            print(f"[{worker_id}] Job {job_id} rejected: {e}")
+            return
+        except Exception as e:
+            queue.fail(job_id, worker_id, e)
+            print(f"[{worker_id}] Job {job_id} failed: {e}")
+            return
+
+    if lease.lost:
+        print(f"[{worker_id}] Lost the lease on job {job_id}; discarding its result.")
+    elif result["status"] == "failed":
+        queue.fail(job_id, worker_id, result.get("error"))
+        print(f"[{worker_id}] Job {job_id} run failed: {result.get('error')}")
+    elif queue.complete(job_id, worker_id, result):
+        print(f"[{worker_id}] Job {job_id} succeeded.")
+
+
+def queue_drained(queue):
+    """
+    Returns True when no job is queued or running, so none can become available to claim again.
+    """
+    stats = queue.stats()
+    return stats["queued"] == 0 and stats["running"] == 0
+
+
+def restart_delay(crashes):
+    """
+    Returns the seconds to wait before restarting a worker that has crashed ``crashes`` times in a row.
+    """
+    if crashes <= 1:
+        return 0
+    return min(RESTART_BACKOFF_MAX, RESTART_BACKOFF_BASE * 2 ** (crashes - 2))
+
+
+def worker_main(worker_id, queue_path, stop_event, lease_seconds, exit_when_empty):
+    """
+    Entry point of a worker process: claims and runs jobs until asked to stop.
+    """
+    # The supervisor handles Ctrl+C and asks workers to stop after their current job
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    load_dotenv()
+
+    queue = JobQueue(queue_path)
+    project_client = create_project_client(
+        credential=DefaultAzureCredential(),
+        conn_str=os.environ.get(PROJECT_CONNECTION_STRING_ENV)
+    )
+    with project_client:
+        while not stop_event.is_set():
+            job = queue.claim(worker_id, lease_seconds)
+            if job is None:
+                # A running job can still be requeued by a failure or a lapsed lease, so wait for it too
+                if exit_when_empty and queue_drained(queue):
+                    break
+                stop_event.wait(POLL_INTERVAL)
+                continue
+            process_job(queue, project_client, job, lease_seconds)
+            export_metrics()
+
+
+def run_fleet(num_workers, queue_path, lease_seconds, exit_when_empty):
+    """
+    Starts the worker processes, restarts any that die and reports throughput until interrupted.
+    """
+    # Share the configured request and token budgets between the worker processes
+    for env, default in (
+        (throttling.RPM_LIMIT_ENV, throttling.DEFAULT_RPM_LIMIT),
+        (throttling.TPM_LIMIT_ENV, throttling.DEFAULT_TPM_LIMIT),
+    ):
+        os.environ[env] = str(max(1, int(os.environ.get(env, default)) // num_workers))
+
+    context = multiprocessing.get_context("spawn")
+    stop_event = context.Event()
+    node = socket.gethostname()
+    queue = JobQueue(queue_path)
+    processes = {}
+    started_at = {}
+    crashes = {}  # Worker index -> crashes in a row
+    restarts = {}  # Worker index -> time at which a crashed worker is started again
+
+    def start_worker(index):
+        worker_id = f"{node}:worker-{index}"
+        process = context.Process(
+            target=worker_main,
+            args=(worker_id, queue_path, stop_event, lease_seconds, exit_when_empty),
+            name=worker_id
+        )
+        process.start()
+        processes[index] = process
+        started_at[index] = time.monotonic()
+
+    print(f"Starting {num_workers} worker(s) on queue '{queue_path}'...")
+    for index in range(num_workers):
+        start_worker(index)
+
+    last_report = time.monotonic()
+    try:
+        while processes or restarts:
+            time.sleep(1)
+            now = time.monotonic()
+            for index, process in list(processes.items()):
+                if process.is_alive():
+                    continue
+                del processes[index]
+                if process.exitcode == 0 and exit_when_empty:
+                    continue
+                if now - started_at[index] >= HEALTHY_RUN_SECONDS:
+                    crashes[index] = 0
+                crashes[index] = crashes.get(index, 0) + 1
+                delay = restart_delay(crashes[index])
+                print(f"Worker {process.name} exited with code {process.exitcode}; restarting in {delay}s...")
+                restarts[index] = now + delay
+            for index, restart_at in list(restarts.items()):
+                if now >= restart_at:
+                    del restarts[index]
+                    start_worker(index)
+            if time.monotonic() - last_report >= STATS_INTERVAL:
+                print(f"Queue stats: {json.dumps(queue.stats())}")
+                last_report = time.monotonic()
+    except KeyboardInterrupt:
+        print("Stopping workers after their current job...")
+        stop_event.set()
+        for process in processes.values():
+            process.join()
+
+    print(f"Queue stats: {json.dumps(queue.stats())}")
+    print("Worker fleet stopped.")
+
+
+def enqueue_jobs(queue, args):
+    """
+    Adds the jobs described by the command-line arguments to the queue.
+    """
+    if args.from_file:
+        with open(args.from_file, encoding="utf-8") as jobs_file:
+            specs = [json.loads(line) for line in jobs_file if line.strip()]
+    else:
+        agent = {"tools": args.tool}
+        if args.model:
+            agent["model"] = args.model
+        if args.instructions:
+            agent["instructions"] = args.instructions
+        spec = {"prompt": args.prompt, "agent": agent, "files": args.file}
+        if args.output_dir:
+            spec["output_dir"] = args.output_dir
+        if args.tenant:
+            spec["tenant"] = args.tenant
+        specs = [spec]
+
+    for spec in specs:
+        job_id = queue.enqueue(spec, max_attempts=args.max_attempts)
+        print(f"Enqueued job {job_id}")
+
+
+def main():
+    """
+    Parses the command line and enqueues jobs, runs the worker fleet or prints queue statistics.
+    """
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Run agent jobs on a fleet of worker processes.")
+    parser.add_argument(
+        "--queue",
+        default=os.environ.get(JOB_QUEUE_PATH_ENV, DEFAULT_JOB_QUEUE_PATH),
+        help="Path to the SQLite job queue."
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    enqueue_parser = commands.add_parser("enqueue", help="Add jobs to the queue.")
+    source = enqueue_parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--prompt", help="The user message to send to the agent.")
+    source.add_argument("--from-file", help="A JSON Lines file with one job specification per line.")
+    enqueue_parser.add_argument("--tool", action="append", default=[], help="Tool to enable; may be repeated.")
+    enqueue_parser.add_argument("--file", action="append", default=[], help="Input file to upload; may be repeated.")
+    enqueue_parser.add_argument("--model", help="Model deployment for the agent.")
+    enqueue_parser.add_argument("--instructions", help="Instructions for the agent.")
+    enqueue_parser.add_argument("--output-dir", help="Directory where generated files are saved.")
+    enqueue_parser.add_argument("--tenant", help="Tenant whose token budget the job is charged to.")
+    enqueue_parser.add_argument("--max-attempts", type=int, default=DEFAULT_MAX_ATTEMPTS)
+
+    run_parser = commands.add_parser("run", help="Start the worker fleet.")
+    run_parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Number of worker processes.")
+    run_parser.add_argument("--lease-seconds", type=int, default=DEFAULT_LEASE_SECONDS)
+    run_parser.add_argument("--exit-when-empty", action="store_true", help="Stop once no job is queued or running.")
+
+    commands.add_parser("stats", help="Print queue statistics.")
+
+    args = parser.parse_args()
+    if args.command == "enqueue":
+        enqueue_jobs(JobQueue(args.queue), args)
+    elif args.command == "run":
+        if not os.environ.get(PROJECT_CONNECTION_STRING_ENV):
+            raise EnvironmentError(
+                f"Environment variable '{PROJECT_CONNECTION_STRING_ENV}' is not set."
+            )
+        run_fleet(args.workers, args.queue, args.lease_seconds, args.exit_when_empty)
+    else:
+        print(json.dumps(JobQueue(args.queue).stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+import itertools
+import os
+from types import SimpleNamespace
+
+import pytest
+from azure.core.exceptions import ResourceNotFoundError
+
+import agent_flows
+import resource_ledger
+from checkpoint import STAGE_CLEANED_UP, STAGE_MESSAGE_CREATED, STAGE_RUN_SUBMITTED, CheckpointLog
+
+
+class FakeAgents:
+    """
+    In-memory stand-in for ``project_client.agents`` that tracks which resources exist.
+    """
+
+    def __init__(self):
+        self.existing = set()
+        self.calls = []
+        self.runs = {}  # Thread ID -> runs, oldest first
+        self._ids = itertools.count(1)
+
+    def _create(self, prefix):
+        resource_id = f"{prefix}-{next(self._ids)}"
+        self.existing.add(resource_id)
+        self.calls.append(prefix)
+        return SimpleNamespace(id=resource_id)
+
+    def _get(self, resource_id):
+        if resource_id not in self.existing:
+            raise ResourceNotFoundError(f"'{resource_id}' not found.")
+        return SimpleNamespace(id=resource_id)
+
+    get_file = get_vector_store = get_agent = get_thread = _get
+
+    def _delete(self, resource_id):
+        self._get(resource_id)
+        self.existing.discard(resource_id)
+
+    delete_file = delete_vector_store = delete_agent = delete_thread = _delete
+
+    def upload_file_and_poll(self, file_path, purpose, sleep_interval=1):
+        return self._create("file")
+
+    def create_vector_store_and_poll(self, file_ids, name, sleep_interval=1):
+        return self._create("vs")
+
+    def create_agent(self, **kwargs):
+        return self._create("asst")
+
+    def create_thread(self):
+        return self._create("thread")
+
+    def create_message(self, thread_id, role, content):
+        self._get(thread_id)
+        return self._create("msg")
+
+    def create_run(self, thread_id, assistant_id):
+        self._get(thread_id)
+        self._get(assistant_id)
+        run = self._create("run")
+        self.runs.setdefault(thread_id, []).append(SimpleNamespace(id=run.id, status="queued"))
+        return run
+
+    def list_runs(self, thread_id, limit=None):
+        self._get(thread_id)
+        return SimpleNamespace(data=list(reversed(self.runs.get(thread_id, [])))[:limit])
+
+    def get_run(self, thread_id, run_id):
+        return SimpleNamespace(
+            id=run_id, thread_id=thread_id, status="completed", model="gpt-4o-mini", usage=None,
+            created_at=None, started_at=None, completed_at=None, failed_at=None, cancelled_at=None
+        )
+
+    def list_run_steps(self, thread_id, run_id, limit=None):
+        return SimpleNamespace(data=[])
+
+    def list_messages(self, thread_id):
+        return SimpleNamespace(get_last_message_by_role=lambda role: None)
+
+
+@pytest.fixture
+def project_client(tmp_path, monkeypatch):
+    monkeypatch.setenv(resource_ledger.LEDGER_PATH_ENV, str(tmp_path / "ledger.sqlite3"))
+    monkeypatch.setattr(resource_ledger, "_ledger", None)
+    return SimpleNamespace(agents=FakeAgents())
+
+
+@pytest.fixture
+def spec(tmp_path):
+    document = tmp_path / "catalog.pdf"
+    document.write_bytes(b"%PDF")
+    return {"prompt": "Hello", "agent": {"tools": ["file_search"]}, "files": [str(document)]}
+
+
+def test_resume_recreates_resources_deleted_since_the_checkpoint(tmp_path, project_client, spec):
+    agents = project_client.agents
+    agents.existing.update({"file-old", "thread-old"})
+    log = CheckpointLog(str(tmp_path / "checkpoint.jsonl"))
+    checkpoint = log.job("job-1")
+    checkpoint.record("file_uploaded", file_ids={spec["files"][0]: "file-old"})
+    checkpoint.record("vector_store_created", vector_store_id="vs-collected")
+    checkpoint.record("agent_created", agent_id="asst-collected")
+    checkpoint.record("thread_created", thread_id="thread-old")
+    checkpoint.record(STAGE_MESSAGE_CREATED, message_id="msg-old")
+
+    result = agent_flows.run_agent_job(project_client, spec, log.job("job-1"))
+
+    assert result["status"] == "completed"
+    # The vector store and agent are rebuilt; the file, thread and message are reused
+    assert agents.calls == ["vs", "asst", "run"]
+    assert log.job("job-1").stage == STAGE_CLEANED_UP
+
+
+def test_resume_without_thread_redoes_message_and_run(tmp_path, project_client, spec):
+    agents = project_client.agents
+    agents.existing.update({"file-old", "vs-old", "asst-old"})
+    log = CheckpointLog(str(tmp_path / "checkpoint.jsonl"))
+    checkpoint = log.job("job-1")
+    checkpoint.record("file_uploaded", file_ids={spec["files"][0]: "file-old"})
+    checkpoint.record("vector_store_created", vector_store_id="vs-old")
+    checkpoint.record("agent_created", agent_id="asst-old")
+    checkpoint.record("thread_created", thread_id="thread-collected")
+    checkpoint.record(STAGE_MESSAGE_CREATED, message_id="msg-old")
+    checkpoint.record(STAGE_RUN_SUBMITTED, run_id="run-old")
+
+    result = agent_flows.run_agent_job(project_client, spec, log.job("job-1"))
+
+    assert result["run_id"] == "run-3"
+    assert agents.calls == ["thread", "msg", "run"]
+
+
+def test_resume_polls_a_submitted_run_instead_of_resubmitting(tmp_path, project_client, spec):
+    agents = project_client.agents
+    agents.existing.update({"thread-old"})
+    log = CheckpointLog(str(tmp_path / "checkpoint.jsonl"))
+    checkpoint = log.job("job-1")
+    checkpoint.record("thread_created", thread_id="thread-old")
+    checkpoint.record(STAGE_RUN_SUBMITTED, run_id="run-old")
+
+    result = agent_flows.run_agent_job(project_client, spec, log.job("job-1"))
+
+    assert result["run_id"] == "run-old"
+    assert agents.calls == []
+
+
+def test_finished_job_is_not_validated_again(tmp_path, project_client, spec):
+    log = CheckpointLog(str(tmp_path / "checkpoint.jsonl"))
+    first = agent_flows.run_agent_job(project_client, spec, log.job("job-1"))
+    os.remove(spec["files"][0])
+
+    assert agent_flows.run_agent_job(project_client, spec, log.job("job-1")) == first
+    with pytest.raises(agent_flows.JobSpecError):
+        agent_flows.run_agent_job(project_client, spec, log.job("job-2"))
+
+
+@pytest.mark.parametrize("status, adopted", [("in_progress", True), ("completed", True), ("failed", False)])
+def test_resume_adopts_a_run_submitted_before_the_crash(tmp_path, project_client, spec, status, adopted):
+    agents = project_client.agents
+    agents.existing.update({"file-old", "asst-old", "thread-old"})
+    agents.runs["thread-old"] = [SimpleNamespace(id="run-unrecorded", status=status)]
+    log = CheckpointLog(str(tmp_path / "checkpoint.jsonl"))
+    checkpoint = log.job("job-1")
+    checkpoint.record("file_uploaded", file_ids={spec["files"][0]: "file-old"})
+    checkpoint.record("agent_created", agent_id="asst-old")
+    checkpoint.record("thread_created", thread_id="thread-old")
+    checkpoint.record(STAGE_MESSAGE_CREATED, message_id="msg-old")
+
+    result = agent_flows.run_agent_job(project_client, {**spec, "agent": {"tools": []}}, log.job("job-1"))
+
+    if adopted:
+        assert result["run_id"] == "run-unrecorded"
+        assert agents.calls == []
+    else:
+        assert result["run_id"] != "run-unrecorded"
+        assert agents.calls == ["run"]
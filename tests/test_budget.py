@@ -0,0 +1,57 @@
+import os
+
+import pytest
+
+from budget import BudgetExceededError, TokenBudget, parse_mapping
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "budget.sqlite3")
+
+
+def test_select_model_rejects_a_tenant_at_its_limit(path):
+    budget = TokenBudget(path, limits={"team-a": 1000})
+    budget.charge("team-a", 600)
+    assert budget.select_model("gpt-4o", "team-a") == "gpt-4o"
+
+    budget.charge("team-a", 400)
+    with pytest.raises(BudgetExceededError) as error:
+        budget.select_model("gpt-4o", "team-a")
+
+    assert (error.value.tenant, error.value.used, error.value.limit) == ("team-a", 1000, 1000)
+
+
+def test_select_model_downgrades_past_the_threshold(path):
+    budget = TokenBudget(path, limits={"*": 1000}, downgrade_at=0.8, downgrades={"gpt-4o": "gpt-4o-mini"})
+    budget.charge("team-b", 799)
+    assert budget.select_model("gpt-4o", "team-b") == "gpt-4o"
+
+    budget.charge("team-b", 1)
+    assert budget.select_model("gpt-4o", "team-b") == "gpt-4o-mini"
+    # Models without a cheaper replacement are kept
+    assert budget.select_model("gpt-4o-mini", "team-b") == "gpt-4o-mini"
+    # Each tenant is charged separately
+    assert budget.select_model("gpt-4o", "team-c") == "gpt-4o"
+
+
+def test_usage_outside_the_window_is_not_counted(path):
+    budget = TokenBudget(path, limits={"team-a": 1000}, window=0)
+    budget.charge("team-a", 5000)
+
+    assert budget.used("team-a") == 0
+    assert budget.select_model("gpt-4o", "team-a") == "gpt-4o"
+
+
+def test_without_a_budget_nothing_is_stored(path):
+    budget = TokenBudget(path, limits={"team-a": 1000})
+    budget.charge("team-b", 5000)
+
+    assert budget.select_model("gpt-4o", "team-b") == "gpt-4o"
+    assert budget.used("team-b") == 0
+    assert not os.path.exists(path)
+
+
+def test_parse_mapping():
+    assert parse_mapping("team-a=200000, *=100000,broken,=5", int) == {"team-a": 200000, "*": 100000}
+    assert parse_mapping(None) == {}
@@ -0,0 +1,46 @@
+from checkpoint import (
+    STAGE_AGENT_CREATED,
+    STAGE_FILE_UPLOADED,
+    STAGE_VECTOR_STORE_CREATED,
+    CheckpointLog
+)
+
+
+def test_replays_latest_stage_and_merged_data(tmp_path):
+    log = CheckpointLog(str(tmp_path / "checkpoint.jsonl"))
+    log.job("job-1").record(STAGE_FILE_UPLOADED, file_ids={"a.pdf": "file-1"})
+    log.job("job-1").record(STAGE_VECTOR_STORE_CREATED, vector_store_id="vs-1")
+
+    checkpoint = log.job("job-1")
+
+    assert checkpoint.stage == STAGE_VECTOR_STORE_CREATED
+    assert checkpoint.data == {"file_ids": {"a.pdf": "file-1"}, "vector_store_id": "vs-1"}
+    assert log.job("job-2").stage is None
+
+
+def test_torn_last_line_is_cut_before_the_next_append(tmp_path):
+    path = tmp_path / "checkpoint.jsonl"
+    CheckpointLog(str(path)).job("job-1").record(STAGE_FILE_UPLOADED, file_ids={"a.pdf": "file-1"})
+    with open(path, "a", encoding="utf-8") as log_file:
+        log_file.write('{"job_id": "job-1", "stage": "vector_sto')
+
+    # A restarted batch opens a fresh log, replays it and records the next stage
+    log = CheckpointLog(str(path))
+    checkpoint = log.job("job-1")
+    assert checkpoint.stage == STAGE_FILE_UPLOADED
+    checkpoint.record(STAGE_VECTOR_STORE_CREATED, vector_store_id="vs-1")
+    checkpoint.record(STAGE_AGENT_CREATED, agent_id="asst-1")
+
+    restored = CheckpointLog(str(path)).job("job-1")
+    assert restored.stage == STAGE_AGENT_CREATED
+    assert restored.get("vector_store_id") == "vs-1"
+    assert path.read_text(encoding="utf-8").endswith("\n")
+
+
+def test_log_without_any_complete_line_is_emptied(tmp_path):
+    path = tmp_path / "checkpoint.jsonl"
+    path.write_text('{"job_id": "job-1", "sta', encoding="utf-8")
+
+    CheckpointLog(str(path)).job("job-1").record(STAGE_FILE_UPLOADED, file_ids={})
+
+    assert CheckpointLog(str(path)).job("job-1").stage == STAGE_FILE_UPLOADED
@@ -0,0 +1,93 @@
+import pytest
+
+from job_queue import STATUS_FAILED, STATUS_QUEUED, STATUS_SUCCEEDED, JobQueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / "jobs.sqlite3"))
+
+
+def test_claim_hands_out_jobs_oldest_first_and_only_once(queue):
+    first = queue.enqueue({"prompt": "first"})
+    second = queue.enqueue({"prompt": "second"})
+
+    job = queue.claim("worker-1")
+    assert job["job_id"] == first
+    assert job["payload"] == {"prompt": "first"}
+    assert job["attempts"] == 1
+    assert job["worker_id"] == "worker-1"
+
+    assert queue.claim("worker-2")["job_id"] == second
+    assert queue.claim("worker-3") is None
+
+
+def test_lapsed_lease_is_claimed_by_another_worker(queue):
+    job_id = queue.enqueue({"prompt": "hello"})
+    queue.claim("worker-1", lease_seconds=0)
+
+    job = queue.claim("worker-2")
+
+    assert job["job_id"] == job_id
+    assert job["attempts"] == 2
+    # The first worker no longer holds the job, so it can neither extend nor finish it
+    assert not queue.heartbeat(job_id, "worker-1")
+    assert not queue.complete(job_id, "worker-1", {"status": "completed"})
+    assert queue.complete(job_id, "worker-2", {"status": "completed"})
+    assert queue.get(job_id)["status"] == STATUS_SUCCEEDED
+
+
+def test_heartbeat_keeps_the_lease(queue):
+    job_id = queue.enqueue({"prompt": "hello"})
+    queue.claim("worker-1", lease_seconds=0)
+
+    assert queue.heartbeat(job_id, "worker-1", lease_seconds=60)
+    assert queue.claim("worker-2") is None
+
+
+def test_lease_lapsing_after_the_last_attempt_fails_the_job(queue):
+    job_id = queue.enqueue({"prompt": "hello"}, max_attempts=1)
+    queue.claim("worker-1", lease_seconds=0)
+
+    assert queue.claim("worker-2") is None
+    job = queue.get(job_id)
+    assert job["status"] == STATUS_FAILED
+    assert job["error"] == "Lease expired after the last attempt."
+
+
+def test_fail_requeues_until_attempts_run_out(queue):
+    job_id = queue.enqueue({"prompt": "hello"}, max_attempts=2)
+
+    queue.claim("worker-1")
+    assert queue.fail(job_id, "worker-1", "timed out")
+    assert queue.get(job_id)["status"] == STATUS_QUEUED
+
+    queue.claim("worker-2")
+    assert queue.fail(job_id, "worker-2", "timed out again")
+    job = queue.get(job_id)
+    assert job["status"] == STATUS_FAILED
+    assert job["error"] == "timed out again"
+    assert queue.claim("worker-3") is None
+
+
+def test_fail_without_retry_fails_at_once(queue):
+    job_id = queue.enqueue({"prompt": "hello"})
+    queue.claim("worker-1")
+
+    assert queue.fail(job_id, "worker-1", "bad specification", retry=False)
+    assert queue.get(job_id)["status"] == STATUS_FAILED
+    assert not queue.fail(job_id, "worker-1", "bad specification")
+
+
+def test_stats_counts_jobs_by_status(queue):
+    succeeded = queue.enqueue({"prompt": "one"})
+    queue.enqueue({"prompt": "two"})
+    queue.enqueue({"prompt": "three"})
+    queue.claim("worker-1")
+    queue.complete(succeeded, "worker-1", {"status": "completed"})
+    queue.claim("worker-1")
+
+    stats = queue.stats()
+
+    assert (stats["queued"], stats["running"], stats["succeeded"], stats["failed"]) == (1, 1, 1, 0)
+    assert queue.get(succeeded)["result"] == {"status": "completed"}
@@ -0,0 +1,93 @@
+import sqlite3
+from types import SimpleNamespace
+
+import pytest
+
+import budget
+import metrics
+import throttling
+
+
+class BrokenAgents:
+    def list_run_steps(self, thread_id, run_id, limit=None):
+        raise ValueError("Unexpected run step payload.")
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    monkeypatch.setattr(metrics, "_metrics", None)
+    return metrics.get_metrics()
+
+
+def test_record_run_survives_budget_and_run_step_errors(monkeypatch, registry):
+    def locked_database(self, tenant, tokens):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(budget.TokenBudget, "charge", locked_database)
+    run = SimpleNamespace(
+        id="run_1", thread_id="thread_1", status="completed", model="gpt-4o-mini",
+        usage=SimpleNamespace(prompt_tokens=100, completion_tokens=20, total_tokens=120),
+        created_at=None, started_at=None, completed_at=None, failed_at=None, cancelled_at=None
+    )
+
+    metrics.record_run(SimpleNamespace(agents=BrokenAgents()), run, "test-flow", tenant="team-a")
+
+    snapshot = registry.snapshot()["metrics"]
+    assert snapshot["agent_runs_total"][0]["value"] == 1
+    assert snapshot["agent_run_prompt_tokens"][0]["sum"] == 100
+    assert "agent_run_tool_calls" not in snapshot
+
+
+def test_record_run_charges_the_rate_limiter_beyond_its_estimate(monkeypatch, registry):
+    limiter = throttling.RateLimiter(rpm_limit=60, tpm_limit=60000)
+    monkeypatch.setattr(throttling, "_rate_limiter", limiter)
+    monkeypatch.setenv(throttling.RUN_TOKEN_ESTIMATE_ENV, "1000")
+    run = SimpleNamespace(
+        id="run_1", thread_id="thread_1", status="completed", model="gpt-4o-mini",
+        usage=SimpleNamespace(prompt_tokens=4000, completion_tokens=1000, total_tokens=5000),
+        created_at=None, started_at=None, completed_at=None, failed_at=None, cancelled_at=None
+    )
+
+    metrics.record_run(SimpleNamespace(agents=BrokenAgents()), run, "test-flow")
+
+    assert limiter.metrics()["tokens_admitted"] == 4000
+    assert limiter.tokens.available() == pytest.approx(56000, abs=10)
+
+
+@pytest.mark.parametrize("value, bucket", [(0, 0), (64, 0), (65, 1), (128, 1), (131072, 11), (131073, 12)])
+def test_histogram_buckets_include_their_upper_bound(value, bucket):
+    histogram = metrics.Histogram(metrics.TOKEN_BUCKETS)
+    histogram.observe(value)
+
+    assert histogram.counts.index(1) == bucket
+
+
+def test_histogram_cumulative_counts():
+    histogram = metrics.Histogram([1, 5, 10])
+    for value in (0.5, 1, 3, 10, 50):
+        histogram.observe(value)
+
+    assert histogram.cumulative() == [(1, 2), (5, 3), (10, 4), (float("inf"), 5)]
+    assert (histogram.count, histogram.sum) == (5, 64.5)
+
+
+def test_to_prometheus_format(monkeypatch):
+    monkeypatch.setattr(throttling, "_rate_limiter", throttling.RateLimiter(rpm_limit=60, tpm_limit=60000))
+    registry = metrics.MetricsRegistry()
+    registry.increment("agent_runs_total", {"flow": 'say "hi"\\now', "status": "completed"})
+    registry.observe("agent_run_queue_seconds", {"flow": "f"}, 0.25)
+    registry.observe("agent_run_queue_seconds", {"flow": "f"}, 3)
+
+    lines = registry.to_prometheus().splitlines()
+
+    assert "# TYPE agent_runs_total counter" in lines
+    assert 'agent_runs_total{flow="say \\"hi\\"\\\\now",status="completed"} 1' in lines
+    assert "# TYPE agent_run_queue_seconds histogram" in lines
+    assert 'agent_run_queue_seconds_bucket{flow="f",le="0.5"} 1' in lines
+    assert 'agent_run_queue_seconds_bucket{flow="f",le="5"} 2' in lines
+    assert 'agent_run_queue_seconds_bucket{flow="f",le="+Inf"} 2' in lines
+    assert 'agent_run_queue_seconds_sum{flow="f"} 3.25' in lines
+    assert 'agent_run_queue_seconds_count{flow="f"} 2' in lines
+    assert "agent_rate_limiter_requests_available 60" in lines
+    assert lines.index("# HELP agent_run_queue_seconds Seconds a run waited before the service started it.") < \
+        lines.index("# HELP agent_runs_total Finished agent runs.")
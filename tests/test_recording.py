@@ -0,0 +1,235 @@
+import json
+import runpy
+import time
+from pathlib import Path
+
+import pytest
+import azure.identity
+from azure.ai.projects import AIProjectClient
+from azure.core.pipeline.transport import HttpTransport
+
+import recording
+import resource_ledger
+import throttling
+from recording import (
+    CassetteMismatchError,
+    RecordedResponse,
+    RecordingTransport,
+    ReplayCredential,
+    ReplayTransport,
+    load_cassette
+)
+from project_client import create_project_client
+from throttling import JitteredRetryPolicy
+
+CODE_DIR = Path(__file__).resolve().parent.parent / "code"
+CONNECTION_STRING = "eastus.api.azureml.ms;subscription;resource-group;project"
+FILE_BYTES = bytes(range(256)) * 40
+
+
+class ServiceTransport(HttpTransport):
+    """
+    Stands in for the network: answers agent requests like the service would.
+    """
+
+    def __init__(self, throttle_first_agent=False):
+        self.polls = 0
+        self.throttle_first_agent = throttle_first_agent
+
+    def send(self, request, **kwargs):
+        path = request.url.split("?")[0]
+        headers = {"Content-Type": "application/json"}
+        if request.method == "DELETE":
+            resource_id = path.rsplit("/", 1)[-1]
+            body = {"id": resource_id, "object": "deleted", "deleted": True}
+        elif path.endswith("/messages"):
+            message = {
+                "id": "msg_1",
+                "object": "thread.message",
+                "created_at": 1,
+                "thread_id": "thread_1",
+                "role": "assistant" if request.method == "GET" else "user",
+                "content": [{"type": "text", "text": {"value": "Hello!", "annotations": []}}],
+                "attachments": [],
+                "metadata": {}
+            }
+            body = message if request.method == "POST" else {
+                "object": "list", "data": [message], "first_id": "msg_1", "last_id": "msg_1", "has_more": False
+            }
+        elif path.endswith("/assistants"):
+            if self.throttle_first_agent:
+                self.throttle_first_agent = False
+                return RecordedResponse(request, 429, "Too Many Requests", {**headers, "Retry-After": "30"}, b"{}")
+            body = {"id": "asst_1", "object": "assistant", "created_at": 1, "model": "gpt-4o-mini", "tools": []}
+        elif path.endswith("/threads"):
+            body = {"id": "thread_1", "object": "thread", "created_at": 1, "metadata": {}}
+        elif path.endswith("/runs/run_1/steps"):
+            body = {
+                "object": "list",
+                "data": [{
+                    "id": "step_1",
+                    "object": "thread.run.step",
+                    "type": "tool_calls",
+                    "status": "completed",
+                    "step_details": {
+                        "type": "tool_calls",
+                        "tool_calls": [{"id": "call_1", "type": "file_search", "file_search": {}}]
+                    }
+                }],
+                "first_id": "step_1",
+                "last_id": "step_1",
+                "has_more": False
+            }
+        elif "/runs" in path:
+            self.polls += 1
+            body = {
+                "id": "run_1",
+                "object": "thread.run",
+                "thread_id": "thread_1",
+                "assistant_id": "asst_1",
+                "status": "completed" if self.polls >= 3 else "in_progress",
+                "created_at": 1,
+            }
+        elif path.endswith("/files/file_1/content"):
+            return RecordedResponse(request, 200, "OK", {"Content-Type": "application/octet-stream"}, FILE_BYTES)
+        else:
+            return RecordedResponse(request, 404, "Not Found", headers, b'{"error": {"message": "not found"}}')
+        return RecordedResponse(request, 200, "OK", headers, json.dumps(body).encode("utf-8"))
+
+    def sleep(self, duration):
+        pass
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def __exit__(self, *args):
+        pass
+
+
+def run_flow(transport):
+    client = AIProjectClient.from_connection_string(
+        CONNECTION_STRING, ReplayCredential(), transport=transport, retry_policy=JitteredRetryPolicy()
+    )
+    with client:
+        agent = client.agents.create_agent(model="gpt-4o-mini", name="agent", instructions="Be brief.")
+        thread = client.agents.create_thread()
+        run = client.agents.create_and_process_run(thread_id=thread.id, assistant_id=agent.id, sleep_interval=0)
+        steps = client.agents.list_run_steps(thread_id=thread.id, run_id=run.id)
+        content = b"".join(client.agents.get_file_content("file_1"))
+    return {
+        "agent": agent.id,
+        "status": run.status,
+        "tool_calls": [call.type for call in steps.data[0].step_details.tool_calls],
+        "content": content,
+    }
+
+
+@pytest.fixture
+def cassette(tmp_path):
+    return str(tmp_path / "cassettes" / "session.jsonl.gz")
+
+
+def test_replay_matches_the_recorded_session(cassette):
+    recorded = run_flow(RecordingTransport(cassette, inner=ServiceTransport()))
+    replay = ReplayTransport(cassette)
+
+    assert run_flow(replay) == recorded
+    assert recorded["tool_calls"] == ["file_search"]
+    assert recorded["content"] == FILE_BYTES
+    assert replay.remaining == 0
+
+
+def test_cassette_is_compact_and_has_no_credentials(cassette):
+    run_flow(RecordingTransport(cassette, inner=ServiceTransport()))
+
+    header, interactions = load_cassette(cassette)
+
+    assert header["interactions"] == len(interactions) == 7
+    assert [interaction["request"].split("/workspaces/project")[-1] for interaction in interactions[2:5]] == [
+        "/threads/thread_1/runs?api-version=2024-12-01-preview",
+        "/threads/thread_1/runs/run_1?api-version=2024-12-01-preview",
+        "/threads/thread_1/runs/run_1?api-version=2024-12-01-preview",
+    ]
+    assert all(set(interaction["headers"]) <= recording.RECORDED_HEADERS for interaction in interactions)
+    assert "body_base64" in interactions[-1]
+
+
+def test_recorded_throttling_is_retried_the_same_way_on_replay(cassette):
+    recorded = run_flow(RecordingTransport(cassette, inner=ServiceTransport(throttle_first_agent=True)))
+    _, interactions = load_cassette(cassette)
+    assert interactions[0]["status"] == 429
+
+    replay = ReplayTransport(cassette)
+    started = time.monotonic()
+    assert run_flow(replay) == recorded
+    assert replay.remaining == 0
+    # The recorded Retry-After is honoured only with recorded timing
+    assert time.monotonic() - started < 5
+
+
+def test_unrecorded_request_raises(cassette):
+    run_flow(RecordingTransport(cassette, inner=ServiceTransport()))
+    client = AIProjectClient.from_connection_string(
+        CONNECTION_STRING, ReplayCredential(), transport=ReplayTransport(cassette)
+    )
+
+    client.agents.create_agent(model="gpt-4o-mini", name="agent", instructions="Be brief.")
+    with pytest.raises(CassetteMismatchError):
+        client.agents.create_agent(model="gpt-4o-mini", name="agent", instructions="Be brief.")
+
+
+def test_replayed_client_skips_the_rate_limiter(cassette, monkeypatch):
+    recorded = run_flow(RecordingTransport(cassette, inner=ServiceTransport()))
+    monkeypatch.setenv(recording.CASSETTE_MODE_ENV, recording.MODE_REPLAY)
+    monkeypatch.setenv(recording.CASSETTE_ENV, cassette)
+
+    def no_rate_limiter():
+        raise AssertionError("The rate limiter was used during replay.")
+
+    monkeypatch.setattr(throttling, "get_rate_limiter", no_rate_limiter)
+    options = {}
+    from_connection_string = AIProjectClient.from_connection_string
+
+    def capture_options(**kwargs):
+        options.update(kwargs)
+        return from_connection_string(**kwargs)
+
+    monkeypatch.setattr(AIProjectClient, "from_connection_string", capture_options)
+    client = create_project_client(CONNECTION_STRING, credential=None)
+    agent = client.agents.create_agent(model="gpt-4o-mini", name="agent", instructions="Be brief.")
+
+    assert agent.id == recorded["agent"]
+    assert isinstance(options["credential"], ReplayCredential)
+    assert isinstance(options["retry_policy"], JitteredRetryPolicy)
+    assert "per_retry_policies" not in options
+
+
+def test_replayed_script_does_not_wait_between_polls(cassette, tmp_path, monkeypatch):
+    script = str(CODE_DIR / "01-basic-agent.py")
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("PROJECT_CONNECTION_STRING", CONNECTION_STRING)
+    monkeypatch.setenv(resource_ledger.LEDGER_PATH_ENV, str(tmp_path / "ledger.sqlite3"))
+    monkeypatch.setattr(resource_ledger, "_ledger", None)
+    monkeypatch.setattr(azure.identity, "DefaultAzureCredential", ReplayCredential)
+
+    transport = RecordingTransport(cassette, inner=ServiceTransport())
+    with monkeypatch.context() as record:
+        # Record against the stand-in service without waiting between its polls
+        record.setenv(recording.CASSETTE_MODE_ENV, recording.MODE_RECORD)
+        record.setattr(recording, "poll_interval", lambda default=1: 0)
+        record.setattr(recording, "create_transport", lambda mode: transport)
+        runpy.run_path(script)
+    # The script never closes its client, so its cassette would only be written at exit
+    transport.save()
+    _, interactions = load_cassette(cassette)
+    assert sum("/runs/run_1?" in interaction["request"] for interaction in interactions) == 2
+
+    monkeypatch.setenv(recording.CASSETTE_MODE_ENV, recording.MODE_REPLAY)
+    monkeypatch.setenv(recording.CASSETTE_ENV, cassette)
+    started = time.monotonic()
+    runpy.run_path(script)
+
+    assert time.monotonic() - started < 1
@@ -0,0 +1,142 @@
+import json
+import time
+from types import SimpleNamespace
+
+import pytest
+from azure.core.rest import HttpRequest
+
+from recording import RecordedResponse
+from resource_ledger import (
+    KIND_AGENT,
+    KIND_THREAD,
+    KIND_VECTOR_STORE,
+    LedgerPolicy,
+    ResourceLedger,
+    _resource_path,
+    collect_expired
+)
+
+BASE_URL = (
+    "https://eastus.api.azureml.ms/agents/v1.0/subscriptions/subscription/resourceGroups/resource-group"
+    "/providers/Microsoft.MachineLearningServices/workspaces/project"
+)
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    return ResourceLedger(str(tmp_path / "ledger.sqlite3"), owner="worker-1", ttl=60)
+
+
+def call(policy, method, path, status=200, body=None):
+    request = HttpRequest(method, f"{BASE_URL}{path}?api-version=2024-12-01-preview")
+    content = json.dumps(body or {}).encode("utf-8")
+    response = RecordedResponse(request, status, "", {"Content-Type": "application/json"}, content)
+    policy.on_response(SimpleNamespace(http_request=request), SimpleNamespace(http_response=response))
+
+
+@pytest.mark.parametrize("path, expected", [
+    ("/assistants", ("assistants", None)),
+    ("/assistants/asst_1", ("assistants", "asst_1")),
+    ("/threads", ("threads", None)),
+    ("/threads/thread_1", ("threads", "thread_1")),
+    ("/threads/runs", ("threads", None)),
+    ("/files", ("files", None)),
+    ("/files/file_1", ("files", "file_1")),
+    ("/vector_stores/vs_1", ("vector_stores", "vs_1")),
+    ("/vector_stores/vs_1/files", (None, None)),
+    ("/vector_stores/vs_1/files/file_1", (None, None)),
+    ("/threads/thread_1/messages", (None, None)),
+    ("/threads/thread_1/runs", (None, None)),
+    ("/threads/thread_1/runs/run_1", (None, None)),
+    ("/files/file_1/content", (None, None)),
+])
+def test_resource_path(path, expected):
+    assert _resource_path(f"{BASE_URL}{path}?api-version=2024-12-01-preview") == expected
+
+
+def test_policy_records_created_resources(ledger):
+    policy = LedgerPolicy(ledger, tags={"script": "test"})
+
+    call(policy, "POST", "/assistants", body={"id": "asst_1", "object": "assistant"})
+    call(policy, "POST", "/vector_stores", body={"id": "vs_1", "object": "vector_store"})
+    call(policy, "POST", "/threads/runs", body={"id": "run_1", "object": "thread.run", "thread_id": "thread_1"})
+    call(policy, "POST", "/vector_stores/vs_1/files", body={"id": "file_1", "object": "vector_store.file"})
+    call(policy, "POST", "/threads", status=429, body={"id": "thread_2", "object": "thread"})
+
+    live = {resource["resource_id"]: resource for resource in ledger.live()}
+    assert {resource_id: resource["kind"] for resource_id, resource in live.items()} == {
+        "asst_1": KIND_AGENT,
+        "vs_1": KIND_VECTOR_STORE,
+        "thread_1": KIND_THREAD,
+    }
+    assert json.loads(live["asst_1"]["tags"]) == {"script": "test"}
+    assert live["asst_1"]["owner"] == "worker-1"
+
+
+def test_policy_releases_deleted_and_missing_resources(ledger):
+    policy = LedgerPolicy(ledger)
+    for resource_id in ("asst_1", "asst_2", "asst_3"):
+        ledger.record(KIND_AGENT, resource_id)
+
+    call(policy, "DELETE", "/assistants/asst_1", body={"id": "asst_1", "deleted": True})
+    call(policy, "DELETE", "/assistants/asst_2", status=404)
+    call(policy, "DELETE", "/assistants/asst_3", status=500)
+
+    assert [resource["resource_id"] for resource in ledger.live()] == ["asst_3"]
+
+
+def test_policy_keeps_threads_and_agents_in_use_alive(ledger):
+    policy = LedgerPolicy(ledger)
+    for kind, resource_id in (
+        (KIND_THREAD, "thread_1"), (KIND_AGENT, "asst_1"), (KIND_THREAD, "thread_2"), (KIND_AGENT, "asst_2")
+    ):
+        ledger.record(kind, resource_id, ttl=0)
+
+    # Polling a run uses its thread and, through the run's body, its agent
+    call(policy, "GET", "/threads/thread_1/runs/run_1", body={"id": "run_1", "assistant_id": "asst_1"})
+    call(policy, "POST", "/threads/thread_2/messages", status=404)
+
+    assert {resource["resource_id"] for resource in ledger.expired()} == {"thread_2", "asst_2"}
+
+
+def test_expired_resources_are_claimed_by_one_collector_at_a_time(ledger):
+    ledger.record(KIND_AGENT, "asst_1", ttl=0)
+    ledger.record(KIND_THREAD, "thread_1", ttl=0)
+    ledger.record(KIND_THREAD, "thread_2")
+
+    first = ledger.claim_expired(claim_seconds=0.2, collector="collector-1")
+    assert {resource["resource_id"] for resource in first} == {"asst_1", "thread_1"}
+    assert ledger.claim_expired(collector="collector-2") == []
+
+    # Once the claim lapses, another collector may retry the batch
+    time.sleep(0.3)
+    second = ledger.claim_expired(collector="collector-2")
+    assert {resource["resource_id"] for resource in second} == {"asst_1", "thread_1"}
+
+
+class FlakyAgents:
+    def __init__(self, failing):
+        self.failing = failing
+        self.deleted = []
+
+    def delete_agent(self, resource_id):
+        if resource_id in self.failing:
+            raise RuntimeError("Service unavailable.")
+        self.deleted.append(resource_id)
+
+    delete_thread = delete_agent
+
+
+def test_collect_keeps_the_claim_when_a_delete_fails(ledger):
+    ledger.record(KIND_AGENT, "asst_1", ttl=0)
+    ledger.record(KIND_THREAD, "thread_1", ttl=0)
+    agents = FlakyAgents(failing={"asst_1"})
+
+    deleted = collect_expired(SimpleNamespace(agents=agents), ledger)
+
+    assert deleted == 1
+    assert agents.deleted == ["thread_1"]
+    [remaining] = ledger.live()
+    assert remaining["resource_id"] == "asst_1"
+    assert remaining["claimed_by"] == "worker-1"
+    assert ledger.claim_expired(collector="collector-2") == []
@@ -0,0 +1,221 @@
+import threading
+import time
+from email.utils import formatdate
+
+import pytest
+from azure.core import PipelineClient
+from azure.core.pipeline.transport import HttpTransport
+from azure.core.rest import HttpRequest
+
+import throttling
+from recording import RecordedResponse
+from throttling import (
+    FairQueue,
+    JitteredRetryPolicy,
+    RateLimiter,
+    ThrottlingPolicy,
+    TokenBucket,
+    parse_retry_after
+)
+
+
+class FakeClock:
+    """
+    Stands in for ``time`` in the throttling module, so waits take no real time.
+    """
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+    @staticmethod
+    def time():
+        return time.time()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(throttling, "time", clock)
+    return clock
+
+
+def test_parse_retry_after_prefers_milliseconds():
+    assert parse_retry_after({"retry-after-ms": "1500", "retry-after": "10"}) == 1.5
+
+
+def test_parse_retry_after_reads_seconds_and_http_dates():
+    assert parse_retry_after({"retry-after": "3"}) == 3.0
+    delay = parse_retry_after({"retry-after": formatdate(time.time() + 60, usegmt=True)})
+    assert 55 <= delay <= 60
+
+
+def test_parse_retry_after_ignores_unusable_values():
+    assert parse_retry_after({}) is None
+    assert parse_retry_after({"retry-after": "soon"}) is None
+    assert parse_retry_after({"retry-after-ms": "soon"}) is None
+
+
+def _client(statuses, policies=None, headers=None):
+    """
+    Returns a pipeline client whose transport answers with ``statuses``.
+
+    :param policies: Pipeline policies; defaults to the jittered retry policy without backoff.
+    :param headers: Headers sent with every response.
+    """
+    requests = []
+
+    class Transport(HttpTransport):
+        def send(self, request, **kwargs):
+            requests.append(request)
+            status_code = statuses[len(requests) - 1]
+            response_headers = {"Content-Type": "application/json", **(headers or {})}
+            return RecordedResponse(request, status_code, "", response_headers, b"{}")
+
+        def sleep(self, duration):
+            pass
+
+        def open(self):
+            pass
+
+        def close(self):
+            pass
+
+        def __exit__(self, *args):
+            pass
+
+    if policies is None:
+        policies = [JitteredRetryPolicy(retry_backoff_factor=0)]
+    return PipelineClient("https://example.test", policies=policies, transport=Transport()), requests
+
+
+def test_post_is_retried_after_429_without_retry_after():
+    client, requests = _client([429, 200])
+    response = client.send_request(HttpRequest("POST", "https://example.test/threads/t/runs"))
+    assert response.status_code == 200
+    assert len(requests) == 2
+
+
+def test_post_is_not_retried_after_server_error():
+    client, requests = _client([503, 200])
+    response = client.send_request(HttpRequest("POST", "https://example.test/threads/t/runs"))
+    assert response.status_code == 503
+    assert len(requests) == 1
+
+
+def test_get_is_retried_after_server_error():
+    client, requests = _client([503, 200])
+    response = client.send_request(HttpRequest("GET", "https://example.test/threads/t/runs/r"))
+    assert response.status_code == 200
+    assert len(requests) == 2
+
+
+def test_token_bucket_refills_up_to_its_capacity(clock):
+    bucket = TokenBucket(capacity=60, refill_per_second=1)
+    bucket.take(60)
+    assert bucket.delay(1) == 1.0
+
+    clock.sleep(30)
+    assert bucket.available() == 30
+    assert bucket.delay(40) == 10.0
+    # Requests larger than the bucket wait for a full bucket instead of forever
+    assert bucket.delay(100) == 30.0
+
+    clock.sleep(1000)
+    assert bucket.available() == 60
+    assert bucket.delay(60) == 0.0
+
+
+def test_token_bucket_debt_delays_later_callers(clock):
+    bucket = TokenBucket(capacity=10, refill_per_second=2)
+    bucket.take(10)
+    bucket.take(4)
+
+    assert bucket.available() == -4
+    assert bucket.delay(1) == 2.5
+
+
+def _wait_for_depth(queue, expected):
+    deadline = time.monotonic() + 5
+    while queue.depth() != expected:
+        assert time.monotonic() < deadline, f"Queue depth stayed {queue.depth()}, expected {expected}."
+        time.sleep(0.01)
+
+
+def test_fair_queue_takes_turns_across_conversations():
+    queue = FairQueue()
+    admitted = []
+    ticket = queue.wait_turn("busy")
+
+    def caller(key, label):
+        caller_ticket = queue.wait_turn(key)
+        admitted.append(label)
+        queue.done(key, caller_ticket)
+
+    callers = []
+    waiting = {"busy": 1}
+    for key, label in (("busy", "busy-2"), ("busy", "busy-3"), ("quiet", "quiet-1"), ("other", "other-1")):
+        callers.append(threading.Thread(target=caller, args=(key, label)))
+        callers[-1].start()
+        waiting[key] = waiting.get(key, 0) + 1
+        # Start the callers one at a time, so they queue in a known order
+        _wait_for_depth(queue, waiting)
+
+    queue.done("busy", ticket)
+    for thread in callers:
+        thread.join(5)
+
+    # The busy conversation already had its turn, so the others go before its queued requests
+    assert admitted == ["quiet-1", "other-1", "busy-2", "busy-3"]
+    assert queue.depth() == {}
+
+
+def test_429_pauses_every_conversation(clock):
+    limiter = RateLimiter(rpm_limit=600, tpm_limit=100000)
+    client, requests = _client(
+        [429, 200], policies=[ThrottlingPolicy(limiter, run_token_estimate=500)], headers={"Retry-After": "5"}
+    )
+
+    throttled = client.send_request(HttpRequest("POST", "https://example.test/threads/thread_a/runs"))
+    started = clock.now
+    client.send_request(HttpRequest("GET", "https://example.test/threads/thread_b/messages"))
+
+    assert throttled.status_code == 429
+    assert clock.now - started == 5
+    metrics = limiter.metrics()
+    assert metrics["throttle_events"] == 1
+    assert metrics["requests_admitted"] == 2
+    assert metrics["tokens_admitted"] == 500
+    assert metrics["wait_seconds_total"] == 5
+
+
+def test_metrics_report_waiting_requests():
+    limiter = RateLimiter(rpm_limit=600, tpm_limit=100000)
+    limiter.throttled(retry_after=0.3)
+    callers = [
+        threading.Thread(target=limiter.acquire, args=(conversation,))
+        for conversation in ("thread_a", "thread_b", "thread_b")
+    ]
+    for thread in callers:
+        thread.start()
+
+    deadline = time.monotonic() + 5
+    while limiter.metrics()["queue_depth"] < 3:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    waiting = limiter.metrics()
+    for thread in callers:
+        thread.join(5)
+    finished = limiter.metrics()
+
+    assert waiting["queue_depth_by_conversation"] == {"thread_a": 1, "thread_b": 2}
+    assert waiting["paused_seconds_remaining"] > 0
+    assert finished["queue_depth"] == 0
+    assert finished["requests_admitted"] == 3
+    assert finished["throttle_events"] == 1
+    assert finished["wait_seconds_total"] >= 0.3
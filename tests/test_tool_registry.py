@@ -0,0 +1,152 @@
+import importlib
+import inspect
+import json
+import sys
+from types import SimpleNamespace
+
+import pytest
+from azure.ai.projects.models import FunctionTool
+
+import user_functions
+from tool_registry import ToolRegistry
+
+SAMPLE_SOURCE = '''
+from typing import Dict, List, Optional, Union
+
+
+def search_products(query: str, tags: List[str], limit: int = 10, *, in_stock: Optional[bool] = None,
+                    filters: Dict[str, str] = None) -> str:
+    """
+    Searches the product catalog.
+
+    :param query (str): Free-text search terms.
+    :param tags (List[str]): Tags every result must have.
+    :param limit (int): Maximum number of results.
+    :param in_stock (Optional[bool]): Only return products that are in stock.
+    :return: The matching products as a JSON string.
+    """
+    return query
+
+
+def convert(amount: float, currency: Union[str, None], rates: list, verbose: bool = False) -> str:
+    """
+    Converts an amount between currencies.
+
+    :param amount (float): The amount to convert.
+    """
+    return str(amount)
+
+
+def _helper(value):
+    return value
+'''
+
+
+@pytest.fixture
+def sample_module(tmp_path, monkeypatch, request):
+    name = f"sample_tools_{request.node.name}"
+    path = tmp_path / f"{name}.py"
+    path.write_text(SAMPLE_SOURCE, encoding="utf-8")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    yield SimpleNamespace(name=name, path=path)
+    sys.modules.pop(name, None)
+
+
+def function_tool_definitions(module):
+    functions = {
+        function for name, function in vars(module).items()
+        if inspect.isfunction(function) and function.__module__ == module.__name__ and not name.startswith("_")
+    }
+    return by_name(FunctionTool(functions).definitions)
+
+
+def registry_definitions(registry):
+    return by_name(registry.definitions)
+
+
+def by_name(definitions):
+    dictionaries = [definition.as_dict() for definition in definitions]
+    return sorted(dictionaries, key=lambda definition: definition["function"]["name"])
+
+
+def tool_call(name, arguments):
+    return SimpleNamespace(id="call_1", function=SimpleNamespace(name=name, arguments=arguments))
+
+
+def test_compiled_schemas_match_function_tool_for_user_functions(tmp_path):
+    registry = ToolRegistry(cache_dir=str(tmp_path))
+    registry.register_module("user_functions")
+
+    assert registry_definitions(registry) == function_tool_definitions(user_functions)
+
+
+def test_compiled_schemas_match_function_tool_for_optional_list_and_keyword_only_arguments(tmp_path, sample_module):
+    registry = ToolRegistry(cache_dir=str(tmp_path / "cache"))
+    registry.register_module(sample_module.name)
+
+    module = importlib.import_module(sample_module.name)
+    assert registry_definitions(registry) == function_tool_definitions(module)
+    assert registry.names == ["search_products", "convert"]
+
+
+def test_artifact_is_rebuilt_when_the_source_changes(tmp_path, sample_module):
+    cache_dir = tmp_path / "cache"
+    ToolRegistry(cache_dir=str(cache_dir)).register_module(sample_module.name)
+    artifact_path = cache_dir / f"{sample_module.name}.json"
+    first_hash = json.loads(artifact_path.read_text(encoding="utf-8"))["source_hash"]
+
+    sample_module.path.write_text(
+        SAMPLE_SOURCE + '\n\ndef ping() -> str:\n    """\n    Answers pong.\n    """\n    return "pong"\n',
+        encoding="utf-8"
+    )
+    registry = ToolRegistry(cache_dir=str(cache_dir))
+    registry.register_module(sample_module.name)
+
+    artifact = json.loads(artifact_path.read_text(encoding="utf-8"))
+    assert artifact["source_hash"] != first_hash
+    assert [function["name"] for function in artifact["functions"]] == ["search_products", "convert", "ping"]
+    assert registry.names == ["search_products", "convert", "ping"]
+
+
+def test_cached_artifact_is_used_while_the_source_is_unchanged(tmp_path, sample_module, monkeypatch):
+    cache_dir = str(tmp_path / "cache")
+    ToolRegistry(cache_dir=cache_dir).register_module(sample_module.name)
+
+    def fail(source):
+        raise AssertionError("The schemas were compiled again.")
+
+    monkeypatch.setattr("tool_registry.compile_source", fail)
+    registry = ToolRegistry(cache_dir=cache_dir)
+    registry.register_module(sample_module.name)
+
+    assert registry.names == ["search_products", "convert"]
+
+
+def test_module_is_imported_on_first_call_only(tmp_path, sample_module):
+    registry = ToolRegistry(cache_dir=str(tmp_path / "cache"))
+    registry.register_module(sample_module.name)
+    assert registry.definitions
+    assert sample_module.name not in sys.modules
+
+    output = registry.execute(tool_call("convert", '{"amount": 2.5, "currency": "EUR", "rates": []}'))
+
+    assert output == "2.5"
+    assert sample_module.name in sys.modules
+    assert registry.get("convert") is sys.modules[sample_module.name].convert
+
+
+def test_bad_arguments_are_returned_as_a_json_error(tmp_path, sample_module):
+    registry = ToolRegistry(cache_dir=str(tmp_path / "cache"))
+    registry.register_module(sample_module.name)
+
+    output = json.loads(registry.execute(tool_call("convert", '{"amount": 1, "unknown": true}')))
+
+    assert output["error"].startswith("Error executing function 'convert':")
+
+
+def test_unknown_function_raises(tmp_path, sample_module):
+    registry = ToolRegistry(cache_dir=str(tmp_path / "cache"))
+    registry.register_module(sample_module.name, names=["convert"])
+
+    with pytest.raises(ValueError):
+        registry.get("search_products")
@@ -0,0 +1,27 @@
+from job_queue import JobQueue
+from worker import RESTART_BACKOFF_MAX, queue_drained, restart_delay
+
+
+def test_queue_is_drained_only_when_nothing_is_queued_or_running(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"))
+    job_id = queue.enqueue({"prompt": "hello"})
+    assert not queue_drained(queue)
+
+    queue.claim("worker-1")
+    # Another worker's job may still fail and be queued again
+    assert not queue_drained(queue)
+
+    queue.fail(job_id, "worker-1", "timed out")
+    assert not queue_drained(queue)
+
+    queue.claim("worker-2")
+    queue.complete(job_id, "worker-2", {"status": "completed"})
+    assert queue_drained(queue)
+
+
+def test_restart_delay_grows_with_crashes_in_a_row():
+    delays = [restart_delay(crashes) for crashes in range(1, 12)]
+
+    assert delays[0] == 0
+    assert delays == sorted(delays)
+    assert delays[-1] == RESTART_BACKOFF_MAX